@@ -0,0 +1,178 @@
+"""
+Read-only HTTP API over the dashboard aggregates of the API_SCHEMA schema:
+
+    uvicorn api.app:app --port 8000      (or: python -m api.app)
+
+    GET /kpis?start=2023-01-01&end=2023-01-31
+    GET /top-products?start=2023-01-01&end=2023-01-31&n=10&by=revenue
+    GET /period-comparison?start=2023-01-01&end=2023-01-31
+
+Results are cached per endpoint (LRU + TTL) and dropped as soon as the ETL commits
+new days, which it announces with NOTIFY on API_NOTIFY_CHANNEL.
+"""
+import select
+import threading
+import time
+from contextlib import asynccontextmanager, closing
+from datetime import date, timedelta
+from enum import Enum
+import psycopg2
+import psycopg2.extensions
+from fastapi import FastAPI, HTTPException, Query
+from api.cache import TTLCache, cached
+from db.connection import get_connection
+from db.pool import pooled_connection, close_pool
+from config import API_SCHEMA, API_HOST, API_PORT, API_CACHE_MAXSIZE, API_CACHE_TTL_SECONDS,\
+                   API_NOTIFY_CHANNEL, DB_POOL_MAX
+
+KPI_CACHE = TTLCache(API_CACHE_MAXSIZE, API_CACHE_TTL_SECONDS)
+TOP_PRODUCTS_CACHE = TTLCache(API_CACHE_MAXSIZE, API_CACHE_TTL_SECONDS)
+COMPARISON_CACHE = TTLCache(API_CACHE_MAXSIZE, API_CACHE_TTL_SECONDS)
+CACHES = {"kpis": KPI_CACHE, "top_products": TOP_PRODUCTS_CACHE, "period_comparison": COMPARISON_CACHE}
+
+# Requests run on Starlette's thread pool, which is larger than the connection pool;
+# a full psycopg2 pool raises instead of waiting, so requests queue here
+_db_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+def fetch_all(sql, params):
+    with _db_slots, pooled_connection() as conn, conn.cursor() as cur:
+        cur.execute(sql, params)
+        columns = [col.name for col in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+def invalidate_all():
+    for cache in CACHES.values():
+        cache.clear()
+
+# Listens for the ETL's NOTIFY on a dedicated connection and clears the caches when the API
+# schema got new days. After a lost connection it clears them too, notifications may be missed
+def listen_for_commits(stop):
+    while not stop.is_set():
+        try:
+            # closed on the way out, also when the connection broke and is replaced
+            with closing(get_connection()) as conn:
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {API_NOTIFY_CHANNEL}")
+                invalidate_all()
+                while not stop.is_set():
+                    if select.select([conn], [], [], 1.0)[0]:
+                        conn.poll()
+                        schemas = {notify.payload.split(":", 1)[0] for notify in conn.notifies}
+                        conn.notifies.clear()
+                        if API_SCHEMA in schemas:
+                            invalidate_all()
+        except psycopg2.Error as e:
+            print(f"Cache invalidation listener lost its connection ({e}), reconnecting...")
+            time.sleep(1)
+
+@cached(KPI_CACHE)
+def query_kpis(start, end):
+    rows = fetch_all(f"""
+        SELECT COALESCE(SUM(total_amount), 0) AS total_revenue,
+               COALESCE(SUM(total_costs), 0) AS total_costs,
+               COALESCE(SUM(total_amount) FILTER (WHERE sales_channel = 'Online'), 0) AS online_revenue,
+               COALESCE(SUM(total_amount) FILTER (WHERE sales_channel = 'Offline'), 0) AS offline_revenue,
+               COALESCE(SUM(transactions), 0) AS total_transactions
+        FROM {API_SCHEMA}.agg_daily_sales
+        WHERE day BETWEEN %s AND %s
+    """, (start, end))
+    # distinct customers over a window do not add up from daily rows, this one reads sales
+    customers = fetch_all(f"""
+        SELECT COUNT(DISTINCT customer_id) AS total_customers
+        FROM {API_SCHEMA}.sales
+        WHERE tmstmp >= %s AND tmstmp < %s
+    """, (start, end + timedelta(days=1)))
+    kpis = {**rows[0], **customers[0]}
+    kpis["revenue_per_customer"] = (
+        kpis["total_revenue"] / kpis["total_customers"] if kpis["total_customers"] else None
+    )
+    return kpis
+
+class TopBy(str, Enum):
+    revenue = "revenue"
+    quantity = "quantity"
+    transactions = "transactions"
+
+@cached(TOP_PRODUCTS_CACHE)
+def query_top_products(start, end, n, by):
+    metric = {"revenue": "revenue", "quantity": "quantity_sold", "transactions": "transactions"}[by]
+    return fetch_all(f"""
+        SELECT a.product_id, p.product, p.brand_name,
+               SUM(a.total_amount) AS revenue,
+               SUM(a.quantity_sold) AS quantity_sold,
+               SUM(a.transactions) AS transactions
+        FROM {API_SCHEMA}.agg_daily_sales a
+        JOIN {API_SCHEMA}.products p ON p.product_id = a.product_id
+        WHERE a.day BETWEEN %s AND %s
+        GROUP BY a.product_id, p.product, p.brand_name
+        ORDER BY {metric} DESC NULLS LAST
+        LIMIT %s
+    """, (start, end, n))
+
+# The window against the same number of days right before it
+@cached(COMPARISON_CACHE)
+def query_period_comparison(start, end):
+    days = (end - start).days + 1
+    previous_start, previous_end = start - timedelta(days=days), start - timedelta(days=1)
+    rows = fetch_all(f"""
+        SELECT CASE WHEN day >= %s THEN 'current' ELSE 'previous' END AS period,
+               SUM(total_amount) AS revenue,
+               SUM(total_costs) AS costs,
+               SUM(transactions) AS transactions
+        FROM {API_SCHEMA}.agg_daily_sales
+        WHERE day BETWEEN %s AND %s
+        GROUP BY 1
+    """, (start, previous_start, end))
+    periods = {row.pop("period"): row for row in rows}
+    empty = {"revenue": 0, "costs": 0, "transactions": 0}
+    current, previous = periods.get("current", empty), periods.get("previous", empty)
+
+    change = {
+        metric: (float(current[metric]) / float(previous[metric]) - 1) if previous[metric] else None
+        for metric in empty
+    }
+    return {
+        "current": {"start": start, "end": end, **current},
+        "previous": {"start": previous_start, "end": previous_end, **previous},
+        "change": change,
+    }
+
+def _check_window(start, end):
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+@asynccontextmanager
+async def lifespan(app):
+    stop = threading.Event()
+    listener = threading.Thread(target=listen_for_commits, args=(stop,), daemon=True)
+    listener.start()
+    yield
+    stop.set()
+    listener.join(timeout=5)
+    close_pool()
+
+app = FastAPI(title="Sport gear sales read API", lifespan=lifespan)
+
+@app.get("/kpis")
+def kpis(start: date, end: date):
+    _check_window(start, end)
+    return query_kpis(start, end)
+
+@app.get("/top-products")
+def top_products(start: date, end: date, n: int = Query(10, ge=1, le=100), by: TopBy = TopBy.revenue):
+    _check_window(start, end)
+    return query_top_products(start, end, n, by.value)
+
+@app.get("/period-comparison")
+def period_comparison(start: date, end: date):
+    _check_window(start, end)
+    return query_period_comparison(start, end)
+
+@app.get("/health")
+def health():
+    return {"schema": API_SCHEMA, "caches": {name: cache.stats() for name, cache in CACHES.items()}}
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=API_HOST, port=API_PORT)
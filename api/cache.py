@@ -0,0 +1,62 @@
+import time
+import threading
+import functools
+from collections import OrderedDict
+
+# Least-recently-used result cache whose entries also expire after `ttl` seconds.
+# clear() bumps a generation counter, so a query that was already running when the
+# ETL committed new days does not put its (now stale) result back afterwards
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    # Returns (found, value, generation); pass the generation on to put()
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1], self._generation
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None, self._generation
+
+    def put(self, key, value, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Memoizes a function of hashable positional arguments in the given cache
+def cached(cache):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            found, value, generation = cache.get(args)
+            if found:
+                return value
+            value = func(*args)
+            cache.put(args, value, generation)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,109 @@
+"""
+Memory benchmark for the typed raw-feed schemas.
+
+Reads the online and offline Kaggle files once with inferred dtypes (plain pd.read_csv) and
+once with the typed schemas from config.py, and reports the in-memory frame size and the
+peak RSS of every read:
+
+    python -m benchmarks.memory
+    python -m benchmarks.memory --rows 1000000 --out memory_output.json
+
+The files are taken from raw_data/ (or --online / --offline). Without them, --rows synthetic
+rows are generated into a temporary folder instead. Every read runs in a fresh process, so
+memory freed by one read does not hide the peak of the next.
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+# One read of one file, in a child process; typed reads use the schema of the file
+def measure(path, schema=None):
+    import pandas as pd
+    from metrics import PeakRSS
+    from storage.formats import read_typed_csv
+
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        df = read_typed_csv(path, schema) if schema else pd.read_csv(path)
+        seconds = time.perf_counter() - start
+    return {
+        "rows": len(df),
+        "seconds": round(seconds, 3),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 2 ** 20, 1),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+        "object_columns": int((df.dtypes == object).sum()),
+    }
+
+
+def measure_isolated(path, schema=None):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(measure, path, schema).result()
+
+
+# Writes synthetic raw files under the Kaggle file names, sorted like the downloaded ones
+def synthetic_files(rows, folder):
+    from config import ONLINE_FILE_NAME, OFFLINE_FILE_NAME
+    from benchmarks.synthetic import generate_sales
+
+    online, offline = generate_sales(rows)
+    paths = {ONLINE_FILE_NAME: os.path.join(folder, ONLINE_FILE_NAME),
+             OFFLINE_FILE_NAME: os.path.join(folder, OFFLINE_FILE_NAME)}
+    online.to_csv(paths[ONLINE_FILE_NAME], index=False)
+    offline.to_csv(paths[OFFLINE_FILE_NAME], index=False)
+    return paths
+
+
+def run(paths):
+    from config import RAW_FILE_SCHEMAS
+
+    results = []
+    for name, path in paths.items():
+        inferred = measure_isolated(path)
+        typed = measure_isolated(path, RAW_FILE_SCHEMAS[name])
+        result = {
+            "file": name,
+            "inferred": inferred,
+            "typed": typed,
+            "frame_reduction": round(1 - typed["frame_mb"] / inferred["frame_mb"], 3) if inferred["frame_mb"] else None,
+        }
+        results.append(result)
+        print(json.dumps(result))
+
+    # the extractor keeps both raw files resident, so their sum is what matters
+    inferred_mb = sum(r["inferred"]["frame_mb"] for r in results)
+    typed_mb = sum(r["typed"]["frame_mb"] for r in results)
+    print(f"Both files resident: {inferred_mb:.1f} MB inferred -> {typed_mb:.1f} MB typed")
+    return results
+
+
+def main():
+    from config import ONLINE_FILE_NAME, OFFLINE_FILE_NAME, RAW_DATA_FOLDER
+
+    parser = argparse.ArgumentParser(description="Compare inferred and typed reads of the raw sales files")
+    parser.add_argument("--online", default=os.path.join(RAW_DATA_FOLDER, ONLINE_FILE_NAME))
+    parser.add_argument("--offline", default=os.path.join(RAW_DATA_FOLDER, OFFLINE_FILE_NAME))
+    parser.add_argument("--rows", type=int, default=1_000_000,
+                        help="synthetic online + offline rows when the raw files are not there")
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if os.path.exists(args.online) and os.path.exists(args.offline):
+            paths = {ONLINE_FILE_NAME: args.online, OFFLINE_FILE_NAME: args.offline}
+        else:
+            print(f"Raw files not found, generating {args.rows} synthetic rows...")
+            paths = synthetic_files(args.rows, folder)
+        results = run(paths)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"files": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Offline throughput benchmark for the ETL path.
+
+Generates synthetic online/offline sales, then times every stage against a local
+S3 stand-in (moto by default, or the MinIO from docker-compose) and a local Postgres:
+
+    python -m benchmarks.run --rows 100000 --out bench_output.json
+    python -m benchmarks.run --rows 100000 --baseline bench_baseline.json
+
+Each stage reports rows/sec and peak RSS as one JSON object. With --baseline the run
+fails when a stage is slower than the baseline by more than --tolerance.
+The moto stand-in needs `pip install -r benchmarks/requirements.txt`; Postgres is
+taken from the DB_* settings in .env and only the `bench` schema is touched.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from contextlib import contextmanager
+
+BENCH_SCHEMA = "bench"
+BENCH_BUCKETS = {
+    "MINIO_RAW": "bench-raw",
+    "MINIO_UNPROCESSED": "bench-unprocessed",
+    "MINIO_PROCESSED": "bench-processed",
+}
+
+
+@contextmanager
+def stage(results, name, rows):
+    from metrics import PeakRSS  # after configure_s3, metrics imports config
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+    result = {
+        "stage": name,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "peak_rss_mb": round(rss.peak_mb, 1),
+    }
+    results.append(result)
+    print(json.dumps(result))
+
+
+# Points config at throwaway buckets (and at a moto server) before any pipeline module imports it
+def configure_s3(mode, moto_port):
+    for env_name, bucket in BENCH_BUCKETS.items():
+        os.environ[env_name] = bucket
+    if mode == "moto":
+        from moto.server import ThreadedMotoServer
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=moto_port, verbose=False)
+        server.start()
+        os.environ["MINIO_ENDPOINT"] = f"http://127.0.0.1:{moto_port}"
+        os.environ.setdefault("MINIO_ACCESS_KEY", "bench")
+        os.environ.setdefault("MINIO_SECRET_KEY", "bench")
+        return server
+    return None
+
+
+# Creates the bench schema with the project migrations and loads the seed dimensions into it
+def prepare_schema(conn):
+    from config import SEEDS, SEEDS_MAPPING
+    from db.migrate import migrate
+    from scripts.load_dim_tables import copy_seed
+
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    # a missing schema gets every migration again
+    migrate(conn, [BENCH_SCHEMA])
+
+    # SEEDS_MAPPING lists the category tables before products
+    with conn.cursor() as cur:
+        for file_name, table_name in SEEDS_MAPPING.items():
+            copy_seed(cur, os.path.join(SEEDS, file_name), table_name, BENCH_SCHEMA)
+    conn.commit()
+
+
+def run(args):
+    server = configure_s3(args.s3, args.moto_port)
+    from config import MINIO_UNPROCESSED, TMSTMP, DATE
+    from benchmarks.synthetic import generate_sales
+    from etl.etl_customers import transform_customers, upsert_customers
+    from etl.etl_sales import transform_sales, upsert_sales
+    from scripts.extract_raw_to_s3_daily import ensure_bucket_exists
+    from storage.formats import write_day_file
+    from scripts.etl_upsert_customers_sales import download_and_concat
+
+    results = []
+    online, offline = generate_sales(args.rows, days=args.days, seed=args.seed)
+    rows = len(online) + len(offline)
+
+    # S3 write/read of the per-day files
+    ensure_bucket_exists(MINIO_UNPROCESSED)
+    online_days = online.groupby(online[TMSTMP].dt.strftime("%Y/%m/%d"))
+    offline_days = offline.groupby(offline[DATE].dt.strftime("%Y/%m/%d"))
+    keys = {"online": [], "offline": []}
+    with stage(results, "s3_write", rows):
+        for kind, days in (("online", online_days), ("offline", offline_days)):
+            for day, day_df in days:
+                keys[kind].append(write_day_file(day_df, MINIO_UNPROCESSED, f"{day}/", kind, args.format))
+
+    with stage(results, "s3_read", rows):
+        online = download_and_concat(keys["online"]).sort_values(by=TMSTMP)
+        offline = download_and_concat(keys["offline"]).sort_values(by=DATE)
+
+    with stage(results, "transform_customers", rows):
+        customers = transform_customers(online, offline, workers=args.workers)
+
+    if not args.no_db:
+        from db.pool import pooled_connection
+        with pooled_connection() as conn:
+            prepare_schema(conn)
+
+            with stage(results, "upsert_customers", len(customers)):
+                customer_ids = upsert_customers(customers, conn, BENCH_SCHEMA)
+
+            with stage(results, "transform_sales", rows):
+                sales = transform_sales(online, offline, conn, BENCH_SCHEMA, customer_ids=customer_ids,
+                                        workers=args.workers)
+
+            with stage(results, "upsert_sales", len(sales)):
+                upsert_sales(sales, conn, BENCH_SCHEMA)
+
+            if not args.keep_schema:
+                with conn.cursor() as cur:
+                    cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+
+    if server is not None:
+        server.stop()
+    return results
+
+
+# Stages whose rows/sec fell more than `tolerance` below the baseline run
+def regressions(results, baseline, tolerance):
+    previous = {r["stage"]: r for r in baseline}
+    slower = []
+    for result in results:
+        before = previous.get(result["stage"])
+        if before and before.get("rows_per_sec") and result["rows_per_sec"] is not None:
+            if result["rows_per_sec"] < before["rows_per_sec"] * (1 - tolerance):
+                slower.append((result["stage"], before["rows_per_sec"], result["rows_per_sec"]))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ETL stages on synthetic sales")
+    parser.add_argument("--rows", type=int, default=10_000, help="total online + offline rows (10k-10M)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--s3", choices=["moto", "minio"], default="moto",
+                        help="moto runs an in-process S3; minio uses MINIO_ENDPOINT from .env")
+    parser.add_argument("--moto-port", type=int, default=5055)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="day file format")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="transform processes, one calendar day per task (TRANSFORM_WORKERS)")
+    parser.add_argument("--no-db", action="store_true", help="skip the Postgres stages")
+    parser.add_argument("--keep-schema", action="store_true", help=f"keep the '{BENCH_SCHEMA}' schema afterwards")
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"rows": args.rows, "stages": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f)["stages"], args.tolerance)
+        for name, before, now in slower:
+            print(f"REGRESSION {name}: {before} -> {now} rows/sec")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
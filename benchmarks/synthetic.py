@@ -0,0 +1,176 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from config import SEEDS, ONLINE_FILE_NAME, OFFLINE_FILE_NAME,\
+                   OFFLINE_COLUMNS_TO_STANDARDISE, ONLINE_COLUMNS_TO_STANDARDISE
+
+# Raw column layouts of the Kaggle files. Offline columns use the raw names that
+# OFFLINE_COLUMNS_TO_STANDARDISE renames, online ones the names ONLINE_COLUMNS_TO_STANDARDISE renames
+ONLINE_COLUMNS = [
+    "tmstmp", "product_category", "product_subcategory", "product", "brand_name", "product_price",
+    "quantity_sold", "total_amount", "total_costs", "payment_type", "shipping_method", "coupon_discount",
+    "customer_firstname", "customer_lastname", "customer_gender", "customer_age", "customer_shirtsize",
+    "customer_email", "customer_phone", "customer_address", "address_details", "customer_city",
+    "customer_state", "store_website", "employee_firstname", "employee_lastname", "employee_email",
+    "employee_skill", "employee_education"
+]
+OFFLINE_COLUMNS = [
+    "product_name", "brand", "category", "subcategory", "supplier", "date", "price", "quantity_sold",
+    "amount_sold", "cost_amount", "payment_method", "customer_firstname", "customer_lastname",
+    "customer_gender", "customer_email", "customer_phone", "store_type", "store_street", "store_city",
+    "store_state"
+]
+assert set(OFFLINE_COLUMNS_TO_STANDARDISE) <= set(OFFLINE_COLUMNS)
+assert set(ONLINE_COLUMNS_TO_STANDARDISE) <= set(ONLINE_COLUMNS)
+
+FIRST_NAMES = ["Maribelle", "Katerina", "Farleigh", "Stesha", "Aaron", "Orelee", "Zeb", "Dana",
+               "Luis", "Priya", "Jonas", "Mei", "Tariq", "Olga", "Sean", "Ines"]
+LAST_NAMES = ["Crickmer", "Baird", "Geach", "Peiser", "Peerman", "Curmi", "Novak", "Okafor",
+              "Lindqvist", "Moreau", "Haddad", "Kowalski", "Reyes", "Tanaka", "Walsh", "Young"]
+SHIRT_SIZES = ["XS", "S", "M", "L", "XL", "2XL", "3XL"]
+WEBSITES = ["helmetheroshop.com", "pigskinprovisions.com", "gridirongear.net", "endzoneoutlet.com"]
+SUPPLIERS = ["Balistreri Inc.", "NFL Properties LLC", "Riddell Sports Group", "Schutt Sports"]
+COUPONS = [0, 5, 10, 15, 20, 25]
+ONLINE_SHARE = 0.515  # 533k online vs 501k offline rows in the Kaggle files
+
+
+# Dimension values taken from seeds/, so generated rows resolve against the loaded dim tables
+def load_seed_dimensions(seeds_dir=SEEDS):
+    read = lambda name: pd.read_csv(os.path.join(seeds_dir, name))
+    products = (read("products.csv")
+                .merge(read("product_categories.csv"), on="category_id", how="left")
+                .merge(read("product_subcategories.csv"), on="subcategory_id", how="left"))
+    return {
+        "products": products,
+        "stores": read("stores.csv"),
+        "employees": read("employees.csv"),
+        "payment_methods": read("payment_methods.csv")["payment_method"].to_numpy(),
+        "shipping_methods": read("shipping_methods.csv")["shipping_method"].to_numpy(),
+    }
+
+
+def _customers(rng, n_customers, stores):
+    first = rng.choice(FIRST_NAMES, n_customers)
+    last = rng.choice(LAST_NAMES, n_customers)
+    store_rows = stores.iloc[rng.integers(0, len(stores), n_customers)]
+    return pd.DataFrame({
+        "customer_firstname": first,
+        "customer_lastname": last,
+        "customer_gender": rng.choice(["Female", "Male"], n_customers),
+        "customer_email": [f"{f.lower()}.{l.lower()}{i}@example.com" for i, (f, l) in enumerate(zip(first, last))],
+        "customer_phone": rng.integers(2_000_000_000, 9_999_999_999, n_customers),
+        "customer_age": rng.integers(18, 75, n_customers),
+        "customer_shirtsize": rng.choice(SHIRT_SIZES, n_customers),
+        "customer_address": [f"{n} Elgar Terrace" for n in rng.integers(1, 9999, n_customers)],
+        "address_details": [f"PO Box {n}" for n in rng.integers(10000, 99999, n_customers)],
+        "customer_city": store_rows["store_city"].to_numpy(),
+        "customer_state": store_rows["store_state"].to_numpy(),
+    })
+
+
+def _timestamps(rng, n, start, days):
+    seconds = np.sort(rng.integers(0, days * 86400, n))
+    return pd.Timestamp(start) + pd.to_timedelta(seconds, unit="s")
+
+
+# Generates one online and one offline raw frame with `rows` rows in total over `days` days,
+# sorted by time like download_and_prepare_kaggle_files leaves them. Repeat buyers come from
+# a customer pool of about one customer per `rows_per_customer` rows
+def generate_sales(rows, days=30, start="2023-01-01", seed=42, rows_per_customer=20, dims=None):
+    rng = np.random.default_rng(seed)
+    dims = dims or load_seed_dimensions()
+    n_online = int(rows * ONLINE_SHARE)
+    n_offline = rows - n_online
+    customers = _customers(rng, max(100, rows // rows_per_customer), dims["stores"])
+
+    def pick(frame, n):
+        return frame.iloc[rng.integers(0, len(frame), n)].reset_index(drop=True)
+
+    # Online
+    product = pick(dims["products"], n_online)
+    customer = pick(customers, n_online)
+    employee = pick(dims["employees"], n_online)
+    price = rng.uniform(5, 400, n_online).round(2)
+    quantity = rng.integers(1, 8, n_online)
+    online = pd.DataFrame({
+        "tmstmp": _timestamps(rng, n_online, start, days),
+        "product_category": product["product_category"],
+        "product_subcategory": product["product_subcategory"],
+        "product": product["product"],
+        "brand_name": product["brand_name"],
+        "product_price": price,
+        "quantity_sold": quantity,
+        "total_amount": (price * quantity).round(2),
+        "total_costs": (price * quantity * rng.uniform(0.2, 0.6, n_online)).round(2),
+        "payment_type": rng.choice(dims["payment_methods"], n_online),
+        "shipping_method": rng.choice(dims["shipping_methods"][:-1], n_online),  # last one is instore pickup
+        "coupon_discount": rng.choice(COUPONS, n_online),
+        **{col: customer[col] for col in customer.columns},
+        "store_website": rng.choice(WEBSITES, n_online),
+        **{col: employee[col] for col in employee.columns if col != "employee_id"},
+    })[ONLINE_COLUMNS]
+
+    # Offline
+    product = pick(dims["products"], n_offline)
+    customer = pick(customers, n_offline)
+    store = pick(dims["stores"], n_offline)
+    phone = customer["customer_phone"].astype(str)
+    price = rng.uniform(5, 400, n_offline).round(2)
+    quantity = rng.integers(1, 8, n_offline)
+    offline = pd.DataFrame({
+        "product_name": product["product"],
+        "brand": product["brand_name"],
+        "category": product["product_category"],
+        "subcategory": product["product_subcategory"],
+        "supplier": rng.choice(SUPPLIERS, n_offline),
+        "date": _timestamps(rng, n_offline, start, days),
+        "price": price,
+        "quantity_sold": quantity,
+        "amount_sold": (price * quantity).round(2),
+        "cost_amount": (price * quantity * rng.uniform(0.2, 0.6, n_offline)).round(2),
+        "payment_method": rng.choice(dims["payment_methods"], n_offline),
+        "customer_firstname": customer["customer_firstname"],
+        "customer_lastname": customer["customer_lastname"],
+        "customer_gender": customer["customer_gender"],
+        "customer_email": customer["customer_email"],
+        "customer_phone": phone.str[:3] + "-" + phone.str[3:6] + "-" + phone.str[6:],
+        "store_type": store["store_type"],
+        "store_street": store["store_street"],
+        "store_city": store["store_city"],
+        "store_state": store["store_state"],
+    })[OFFLINE_COLUMNS]
+
+    return online, offline
+
+
+# Writes the two raw files in chunks, so 10M-row files never sit in memory at once.
+# Each chunk covers its own slice of days, so the files stay sorted by time
+def write_raw_csvs(out_dir, rows, days=30, start="2023-01-01", seed=42, chunk_rows=1_000_000):
+    os.makedirs(out_dir, exist_ok=True)
+    dims = load_seed_dimensions()
+    online_path = os.path.join(out_dir, ONLINE_FILE_NAME)
+    offline_path = os.path.join(out_dir, OFFLINE_FILE_NAME)
+    chunks = max(1, -(-rows // chunk_rows))
+    days_per_chunk = max(1, days // chunks)
+
+    for i in range(chunks):
+        chunk = min(chunk_rows, rows - i * chunk_rows)
+        chunk_start = pd.Timestamp(start) + pd.Timedelta(days=i * days_per_chunk)
+        online, offline = generate_sales(chunk, days_per_chunk, chunk_start, seed + i, dims=dims)
+        online.to_csv(online_path, index=False, header=(i == 0), mode="w" if i == 0 else "a")
+        offline.to_csv(offline_path, index=False, header=(i == 0), mode="w" if i == 0 else "a")
+        print(f"Wrote chunk {i + 1}/{chunks} ({chunk} rows)")
+
+    return online_path, offline_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic raw online/offline sales CSVs")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--start", default="2023-01-01")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_data")
+    args = parser.parse_args()
+    write_raw_csvs(args.out, args.rows, args.days, args.start, args.seed)
@@ -1,5 +1,6 @@
 import os
 import boto3
+from botocore.config import Config
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -23,14 +24,32 @@ MINIO_PROCESSED=os.getenv("MINIO_PROCESSED")
 # List of unprocessed and processed buckets
 BUCKET_LIST = [MINIO_UNPROCESSED, MINIO_PROCESSED]
 
-# Initialize S3 client
+# Backfill of the daily extractor: "latest" (up to the last raw day), a YYYY/MM/DD date, or empty for off
+BACKFILL_UNTIL = os.getenv("BACKFILL_UNTIL", "")
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", 8))
+
+# Day file downloads of the upsert ETL: parallel GETs, and a cap on raw bytes held at once
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", 8))
+FETCH_MAX_BYTES_IN_FLIGHT = int(os.getenv("FETCH_MAX_BYTES_IN_FLIGHT", 256 * 2**20))
+
+# Initialize S3 client (thread-safe; the connection pool is sized for the backfill and fetch threads)
 S3 = boto3.client(
     "s3",
     endpoint_url=MINIO_ENDPOINT,
     aws_access_key_id=ACCESS_KEY,
     aws_secret_access_key=SECRET_KEY,
+    config=Config(max_pool_connections=max(10, 2 * BACKFILL_CONCURRENCY, FETCH_CONCURRENCY)),
 )
 
+# Database connection pool (db/pool.py), session settings are applied once per connection
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 8))
+DB_SYNCHRONOUS_COMMIT = os.getenv("DB_SYNCHRONOUS_COMMIT", "on")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 300000))
+DB_HEALTHCHECK_IDLE_SECONDS = 10  # pooled connections idle longer than this are pinged before use
+DB_CONNECT_RETRIES = 6
+DB_CONNECT_BACKOFF = 0.5  # seconds, doubled on every failed attempt
+
 # Schemas used in the project
 SCHEMAS = ["prod", "playground"]
 
@@ -53,9 +72,107 @@ SEEDS_MAPPING = {
     "stores.csv": "stores"
 }
 
+# Seed tables that reference other seed tables and have to be loaded after them
+SEED_DEPENDENCIES = {
+    "products": ["product_categories", "product_subcategories"],
+}
+
+# Object format of the daily files in the unprocessed/processed buckets: "csv" or "parquet".
+# Readers detect the format per object, so switching keeps older CSV days loadable
+OBJECT_FORMAT = os.getenv("OBJECT_FORMAT", "csv")
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")  # "zstd" or "snappy"
+DAY_FILE_EXTENSIONS = {"csv": ".csv", "parquet": ".parquet"}
+
+# Typed schemas of the raw online and offline feeds, applied whenever they are read (Kaggle files,
+# ranged day reads, day files) and when day files are written as Parquet. Low-cardinality text
+# is categorical, counts are nullable integers so a missing value does not widen them to float
+ONLINE_SCHEMA = {
+    "tmstmp": "datetime64[ns]",
+    "product_category": "category",
+    "product_subcategory": "category",
+    "product": "category",
+    "brand_name": "category",
+    "product_price": "float64",
+    "quantity_sold": "Int64",
+    "total_amount": "float64",
+    "total_costs": "float64",
+    "payment_type": "category",
+    "shipping_method": "category",
+    "coupon_discount": "float64",
+    "customer_firstname": "string",
+    "customer_lastname": "string",
+    "customer_gender": "category",
+    "customer_age": "Int64",
+    "customer_shirtsize": "category",
+    "customer_email": "string",
+    "customer_phone": "string",
+    "customer_address": "string",
+    "address_details": "string",
+    "customer_city": "category",
+    "customer_state": "category",
+    "store_website": "category",
+    "employee_firstname": "category",
+    "employee_lastname": "category",
+    "employee_email": "category",
+    "employee_skill": "category",
+    "employee_education": "category"
+}
+
+OFFLINE_SCHEMA = {
+    "product_name": "category",
+    "brand": "category",
+    "category": "category",
+    "subcategory": "category",
+    "supplier": "category",
+    "date": "datetime64[ns]",
+    "price": "float64",
+    "quantity_sold": "Int64",
+    "amount_sold": "float64",
+    "cost_amount": "float64",
+    "payment_method": "category",
+    "customer_firstname": "string",
+    "customer_lastname": "string",
+    "customer_gender": "category",
+    "customer_email": "string",
+    "customer_phone": "string",
+    "store_type": "category",
+    "store_street": "category",
+    "store_city": "category",
+    "store_state": "category"
+}
+
+DAY_FILE_SCHEMAS = {"online": ONLINE_SCHEMA, "offline": OFFLINE_SCHEMA}
+RAW_FILE_SCHEMAS = {ONLINE_FILE_NAME: ONLINE_SCHEMA, OFFLINE_FILE_NAME: OFFLINE_SCHEMA}
+
+# File ledger discovery: list only from LEDGER_LOOKBACK_DAYS before the newest known day
+# (late uploads from parallel backfills land there), and fully re-list every N cycles
+LEDGER_LOOKBACK_DAYS = 7
+LEDGER_RECONCILE_EVERY = 180
+
+# Upsert ETL micro-batches: whole days in date order, at most this many files per download
+# and this many rows per transaction (a single day larger than that is still loaded whole)
+ETL_BATCH_MAX_FILES = int(os.getenv("ETL_BATCH_MAX_FILES", 60))
+ETL_BATCH_MAX_ROWS = int(os.getenv("ETL_BATCH_MAX_ROWS", 500000))
+
+# Customer and sales transforms on a process pool, one task per calendar day (etl/parallel.py).
+# 1 keeps them in the ETL process; batches below TRANSFORM_PARALLEL_MIN_ROWS always stay there
+TRANSFORM_WORKERS = int(os.getenv("TRANSFORM_WORKERS", 1))
+TRANSFORM_PARALLEL_MIN_ROWS = int(os.getenv("TRANSFORM_PARALLEL_MIN_ROWS", 100000))
+
 # Sleep time between ETL batches (in seconds)
 TIME_TO_SLEEP = 10
-TIME_TO_SLEEP_ETL = 20
+TIME_TO_SLEEP_ETL = 20  # longest wait of the upsert poller, reached after idle cycles
+ETL_POLL_MIN_SECONDS = 1  # wait after a cycle that loaded data, doubled on every idle cycle
+
+# Readiness probes of Postgres and MinIO (orchestrator.py): polled from 0.1 s, doubled up to the interval
+READINESS_TIMEOUT = int(os.getenv("READINESS_TIMEOUT", 120))
+READINESS_MAX_INTERVAL = 2
+
+# Byte-offset day index stored next to each raw file, e.g. AF_online_sales_dataset.csv.day_index.json
+DAY_INDEX_SUFFIX = ".day_index.json"
+
+# Extraction watermark and gaps of extract_raw_to_s3_daily, kept in the raw bucket
+EXTRACT_CHECKPOINT_KEY = "_checkpoints/extract_raw_to_s3_daily.json"
 
 # Other shared settings
 DATE_FORMAT = "%Y/%m/%d"
@@ -65,13 +182,32 @@ TMSTMP =  "tmstmp"
 DATE = "date"
 
 # Paths
-CREATE_TABLES_SCHEMAS_PATH = "db/ddl/create_schemas_tables.sql"
+MIGRATIONS_DIR = "db/migrations"
 DROP_TABLE_SCHEMAS_PATH = "db/ddl/drop_schemas_tables.sql"
 TRUNCATE_ALL_TABLES_PATH = "db/ddl/trancate_all_tables.sql"
 TRUNCATE_DIM_TABLES_PATH = "db/ddl/trancate_dim_tables.sql"
+CREATE_ETL_META_TABLES_PATH = "db/ddl/create_etl_meta_tables.sql"
 
 SCRIPT_ETL = "scripts/5_run_etl_upsert.py"
 
+# Daily dashboard aggregates maintained by the ETL (db/migrations/0003)
+AGGREGATE_TABLES = ["agg_daily_sales", "agg_daily_customer_state"]
+
+# Read API over the aggregates (api/app.py). Results are cached per endpoint (LRU + TTL)
+# and dropped when the ETL commits new days, announced with NOTIFY on API_NOTIFY_CHANNEL
+API_SCHEMA = os.getenv("API_SCHEMA", "prod")
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", 8000))
+API_CACHE_MAXSIZE = 256
+API_CACHE_TTL_SECONDS = int(os.getenv("API_CACHE_TTL_SECONDS", 300))
+API_NOTIFY_CHANNEL = "sales_committed"
+
+# Stage metrics (metrics.py): Prometheus textfiles go to METRICS_DIR/<job>.prom. PROFILE_STAGES,
+# e.g. "fetch,transform_sales" or "all", profiles those stages into PROFILE_DIR
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+PROFILE_STAGES = [name.strip() for name in os.getenv("PROFILE_STAGES", "").split(",") if name.strip()]
+PROFILE_DIR = os.path.join(METRICS_DIR, "profiles")
+
 #ETL part
 # Customers ETL variables
 BASE_COLS = [
@@ -98,15 +234,20 @@ ONLINE_COLUMNS_TO_STANDARDISE = {
 OFFLINE_SALES_CHANNEL = "Offline"
 ONLINE_SALES_CHANNEL = "Online"
 
+# Pairs returned by the customer upsert and used by transform_sales to resolve customer_id
+CUSTOMER_ID_COLUMNS = ["customer_email", "customer_id"]
+
+# Local sqlite store of per-customer content hashes and ids (etl/customer_cache.py)
+CUSTOMER_CACHE_PATH = os.getenv("CUSTOMER_CACHE_PATH", "cache/customers.sqlite")
+
+# Stored md5 of the upserted columns of customers and sales (db/migrations/0004)
+ROW_HASH_COLUMN = "row_hash"
+
 DIM_TABLES = {
     "products": {
         "columns": ["product_id", "product", "brand_name"],
         "join_keys": ["product", "brand_name"]
     },
-    "customers": {
-        "columns": ["customer_id", "customer_email"],
-        "join_keys": ["customer_email"]
-    },
     "stores": {
         "columns": ["store_id", "store_type", "store_street", "store_city", "store_state"],
         "join_keys": ["store_type", "store_street", "store_city", "store_state"]
@@ -131,4 +272,6 @@ SALES_COLUMN_ORDER = [
     'payment_method_id', 'shipping_method_id', 'product_price', 'coupon_discount',
     'quantity_sold', 'total_amount', 'total_costs', 'sales_channel', 'store_website', 'supplier'
 ]
+# sales upsert key, also used when the batch is replicated into playground
+SALES_CONFLICT_KEYS = ["customer_id", "tmstmp"]
 
@@ -0,0 +1,181 @@
+import io
+from typing import NamedTuple, Optional
+import pandas as pd
+
+# What one copy_upsert call did; returned holds the RETURNING columns asked for, if any
+# (with a hash column, only for inserted and updated rows)
+class UpsertResult(NamedTuple):
+    sent: int
+    inserted: int
+    updated: int
+    returned: Optional[pd.DataFrame] = None
+    unchanged: int = 0
+
+# Marker written by to_csv for missing values and read back as NULL by COPY
+COPY_NULL = "\\N"
+
+# Object columns are re-inferred (the transforms hand over None-filled object frames) and
+# float columns holding only whole numbers are sent as integers, so INT targets accept "3" not "3.0"
+def prepare_for_copy(df: pd.DataFrame) -> pd.DataFrame:
+    prepared = df.copy()
+    for col in prepared.columns:
+        series = prepared[col]
+        if series.dtype == object:
+            series = series.infer_objects()
+        if pd.api.types.is_float_dtype(series):
+            values = series.dropna()
+            if (values % 1 == 0).all():
+                series = series.astype("Int64")
+        prepared[col] = series
+    return prepared
+
+# A set-based ON CONFLICT cannot touch the same row twice in one statement, so rows sharing
+# a conflict key are collapsed to the last one (the row the per-row upsert would have left).
+# Rows with a NULL in the key never conflict in Postgres and are all kept.
+def dedupe_conflict_keys(df: pd.DataFrame, conflict_keys) -> pd.DataFrame:
+    keyed = df[conflict_keys].notna().all(axis=1)
+    duplicated = keyed & df.duplicated(subset=conflict_keys, keep="last")
+    return df[~duplicated]
+
+def staging_table(schema, table):
+    return f"_stg_{schema}_{table}"
+
+# Creates an empty temp table with the column types of the target, dropped on commit
+def create_staging_table(cur, schema, table, columns):
+    staging = staging_table(schema, table)
+    col_str = ', '.join(columns)
+    cur.execute(f"DROP TABLE IF EXISTS {staging}")
+    cur.execute(f"""
+        CREATE TEMP TABLE {staging} ON COMMIT DROP AS
+        SELECT {col_str} FROM {schema}.{table} WITH NO DATA
+    """)
+    return staging
+
+# Streams a DataFrame into a table with a single COPY instead of one INSERT per row
+def copy_dataframe(cur, df, table):
+    buffer = io.StringIO()
+    prepare_for_copy(df).to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+    col_str = ', '.join(df.columns)
+    cur.copy_expert(
+        f"COPY {table} ({col_str}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+        buffer
+    )
+
+# Moves the staged rows into the target in one INSERT ... SELECT ... ON CONFLICT and returns
+# (inserted, updated, returned). With `returning`, those columns come back for every upserted
+# row and xmax = 0 marks the newly inserted ones. Otherwise only counts come back: the staged
+# keys missing from the target are counted before the merge, because a partitioned target
+# (sales) cannot return the xmax system column.
+# With `hash_column`, an md5 of the staged columns is stored there and a conflicting row is
+# only updated when its hash differs, so unchanged rows cost no dead tuple and no WAL
+def merge_staging(cur, staging, schema, table, columns, conflict_keys, returning=None, hash_column=None):
+    col_str = ', '.join(columns)
+    updates = [
+        f"{col} = EXCLUDED.{col}"
+        for col in columns
+        if col not in conflict_keys  # do not update the conflict keys
+    ]
+    insert_cols, select_cols, condition = col_str, col_str, ""
+    if hash_column:
+        insert_cols += f", {hash_column}"
+        select_cols += f", md5(ROW({col_str})::text)"
+        updates.append(f"{hash_column} = EXCLUDED.{hash_column}")
+        condition = f"WHERE target.{hash_column} IS DISTINCT FROM EXCLUDED.{hash_column}"
+
+    upsert_sql = f"""
+        INSERT INTO {schema}.{table} AS target ({insert_cols})
+        SELECT {select_cols} FROM {staging}
+        ON CONFLICT ({', '.join(conflict_keys)}) DO UPDATE SET {', '.join(updates)}
+        {condition}
+    """
+
+    if returning:
+        cur.execute(f"{upsert_sql} RETURNING xmax = 0 AS is_inserted, {', '.join(returning)}")
+        rows = cur.fetchall()
+        inserted = sum(1 for row in rows if row[0])
+        returned = pd.DataFrame([row[1:] for row in rows], columns=list(returning))
+        return inserted, len(rows) - inserted, returned
+
+    # a NULL in the key never matches, like it never conflicts
+    key_match = ' AND '.join(f"existing.{key} = staged.{key}" for key in conflict_keys)
+    cur.execute(f"""
+        SELECT COUNT(*) FROM {staging} AS staged
+        WHERE NOT EXISTS (SELECT 1 FROM {schema}.{table} AS existing WHERE {key_match})
+    """)
+    inserted = cur.fetchone()[0]
+    cur.execute(f"WITH upserted AS ({upsert_sql} RETURNING 1) SELECT COUNT(*) FROM upserted")
+    upserted = cur.fetchone()[0]
+    return inserted, upserted - inserted, None
+
+# COPY the batch into a staging table, then upsert it into schema.table in one statement
+# commit=False leaves the transaction open, so several upserts can commit together
+def copy_upsert(df, conn, schema, table, conflict_keys, returning=None, commit=True,
+                hash_column=None) -> UpsertResult:
+    df = dedupe_conflict_keys(df, conflict_keys)
+    columns = list(df.columns)
+
+    with conn.cursor() as cur:
+        staging = create_staging_table(cur, schema, table, columns)
+        copy_dataframe(cur, df, staging)
+        inserted, updated, returned = merge_staging(
+            cur, staging, schema, table, columns, conflict_keys, returning, hash_column
+        )
+
+    if commit:
+        conn.commit()
+    return UpsertResult(len(df), inserted, updated, returned, len(df) - inserted - updated)
+
+# Surrogate ids differ between schemas. Copies the rows staged for source_schema.table into a
+# staging table of schema, with every column of id_maps, {column: (table, natural key)}, set to
+# the id that schema has for the same natural key (e.g. customer_id through customer_email).
+# Rows whose id has no counterpart are left out. Returns the staging table and the rows left out
+def remap_staging(cur, source_schema, schema, table, columns, id_maps):
+    source = staging_table(source_schema, table)
+    staging = staging_table(schema, table)
+    select_cols, joins, mapped = [], [], []
+    for col in columns:
+        if col not in id_maps:
+            select_cols.append(f"staged.{col}")
+            continue
+        ref_table, natural_key = id_maps[col]
+        source_ref, ref = f"{source_schema}_{col}", f"{schema}_{col}"
+        joins.append(f"LEFT JOIN {source_schema}.{ref_table} AS {source_ref} ON {source_ref}.{col} = staged.{col}")
+        joins.append(f"LEFT JOIN {schema}.{ref_table} AS {ref} ON {ref}.{natural_key} = {source_ref}.{natural_key}")
+        select_cols.append(f"{ref}.{col}")
+        mapped.append(f"(staged.{col} IS NULL OR {ref}.{col} IS NOT NULL)")
+
+    cur.execute(f"DROP TABLE IF EXISTS {staging}")
+    cur.execute(f"""
+        CREATE TEMP TABLE {staging} ON COMMIT DROP AS
+        SELECT {', '.join(select_cols)}
+        FROM {source} AS staged {' '.join(joins)}
+        WHERE {' AND '.join(mapped)}
+    """)
+    staged = cur.rowcount
+    cur.execute(f"SELECT COUNT(*) FROM {source}")
+    return staging, cur.fetchone()[0] - staged
+
+# Upserts the rows an earlier copy_upsert into source_schema.table staged (its staging table lives
+# until the transaction commits) into the same table of another schema. It runs server-side in
+# the same transaction, so nothing is sent again and both schemas commit together.
+# id_maps (see remap_staging) translates ids that reference tables with their own identity
+def replicate_upsert(conn, source_schema, schema, table, conflict_keys, commit=True,
+                     hash_column=None, id_maps=None) -> UpsertResult:
+    staging = staging_table(source_schema, table)
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM {staging} LIMIT 0")
+        columns = [col.name for col in cur.description]
+        if id_maps:
+            staging, left_out = remap_staging(cur, source_schema, schema, table, columns, id_maps)
+            if left_out:
+                print(f"Left out {left_out} rows of {schema}.{table} without a matching {', '.join(id_maps)}")
+        cur.execute(f"SELECT COUNT(*) FROM {staging}")
+        sent = cur.fetchone()[0]
+        inserted, updated, _ = merge_staging(
+            cur, staging, schema, table, columns, conflict_keys, hash_column=hash_column
+        )
+
+    if commit:
+        conn.commit()
+    return UpsertResult(sent, inserted, updated, None, sent - inserted - updated)
@@ -4,11 +4,15 @@ import psycopg2
 
 load_dotenv()
 
-def get_connection():
-    return psycopg2.connect(
+# Connection settings from .env, shared by single connections and the pool in db/pool.py
+def connection_params():
+    return dict(
         host=os.getenv("DB_HOST"),
         port=os.getenv("DB_PORT"),
         dbname=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD")
-    )
\ No newline at end of file
+    )
+
+def get_connection():
+    return psycopg2.connect(**connection_params())
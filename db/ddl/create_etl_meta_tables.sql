@@ -0,0 +1,50 @@
+-- Pipeline bookkeeping, shared by all data schemas
+CREATE SCHEMA IF NOT EXISTS etl_meta;
+
+-- One row per day file seen in the unprocessed bucket
+CREATE TABLE IF NOT EXISTS etl_meta.file_ledger (
+    object_key TEXT PRIMARY KEY,
+    etag TEXT,
+    size BIGINT,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending | loaded | processed | failed
+    discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS file_ledger_unprocessed
+    ON etl_meta.file_ledger (object_key) WHERE status <> 'processed';
+
+-- Checksum of the seed file last loaded into each dimension table
+CREATE TABLE IF NOT EXISTS etl_meta.seed_checksums (
+    schema_name TEXT,
+    table_name TEXT,
+    checksum TEXT NOT NULL,
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (schema_name, table_name)
+);
+
+-- Migrations from db/migrations/ applied to each data schema
+CREATE TABLE IF NOT EXISTS etl_meta.schema_migrations (
+    schema_name TEXT,
+    version INT,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (schema_name, version)
+);
+
+-- Metrics of every pipeline stage run (metrics.py)
+CREATE TABLE IF NOT EXISTS etl_meta.stage_runs (
+    run_id TEXT NOT NULL,
+    job TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    seconds DOUBLE PRECISION,
+    rows_in BIGINT,
+    rows_out BIGINT,
+    s3_bytes BIGINT,
+    db_round_trips INT,
+    peak_rss_mb REAL
+);
+
+CREATE INDEX IF NOT EXISTS stage_runs_job_started_at ON etl_meta.stage_runs (job, started_at);
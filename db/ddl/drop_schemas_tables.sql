@@ -1,3 +1,4 @@
 DROP SCHEMA IF EXISTS prod CASCADE;
 DROP SCHEMA IF EXISTS playground CASCADE;
-DROP SCHEMA IF EXISTS public CASCADE;
\ No newline at end of file
+DROP SCHEMA IF EXISTS public CASCADE;
+DROP SCHEMA IF EXISTS etl_meta CASCADE;
\ No newline at end of file
@@ -1,6 +1,8 @@
 -- Then truncate dimension tables
 TRUNCATE TABLE
     {{schema}}.sales,
+    {{schema}}.agg_daily_sales,
+    {{schema}}.agg_daily_customer_state,
     {{schema}}.products,
     {{schema}}.product_subcategories,
     {{schema}}.product_categories,
@@ -9,4 +11,7 @@ TRUNCATE TABLE
     {{schema}}.employees,
     {{schema}}.payment_methods,
     {{schema}}.shipping_methods
-RESTART IDENTITY CASCADE;
\ No newline at end of file
+RESTART IDENTITY CASCADE;
+
+-- Seeds have to be loaded again
+DELETE FROM etl_meta.seed_checksums WHERE schema_name = '{{schema}}';
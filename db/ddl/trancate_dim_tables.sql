@@ -8,4 +8,7 @@ TRUNCATE TABLE
     {{schema}}.employees,
     {{schema}}.payment_methods,
     {{schema}}.shipping_methods
-RESTART IDENTITY CASCADE;
\ No newline at end of file
+RESTART IDENTITY CASCADE;
+
+-- Seeds have to be loaded again
+DELETE FROM etl_meta.seed_checksums WHERE schema_name = '{{schema}}';
@@ -0,0 +1,81 @@
+from psycopg2.extras import execute_values
+from config import CREATE_ETL_META_TABLES_PATH
+
+# etl_meta.file_ledger records every day file of the unprocessed bucket with its ETag, size
+# and status, so the ETL does not have to diff full listings of two buckets every cycle
+
+_ledger_ready = False
+
+def ensure_ledger(conn):
+    global _ledger_ready
+    if _ledger_ready:
+        return
+    with open(CREATE_ETL_META_TABLES_PATH, "r") as f:
+        sql = f.read()
+    with conn.cursor() as cur:
+        cur.execute(sql)
+    conn.commit()
+    _ledger_ready = True
+
+def ledger_is_empty(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT NOT EXISTS (SELECT 1 FROM etl_meta.file_ledger)")
+        return cur.fetchone()[0]
+
+# Highest key ever seen; keys are YYYY/MM/DD/<kind>.<ext>, so this is the latest day
+def ledger_watermark(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT MAX(object_key) FROM etl_meta.file_ledger")
+        return cur.fetchone()[0]
+
+# Adds new objects as pending and re-opens objects whose ETag changed (re-uploaded day);
+# objects already known with the same ETag are left alone. objects: [(key, etag, size)]
+def record_objects(conn, objects, status="pending"):
+    if not objects:
+        return 0
+    with conn.cursor() as cur:
+        # RETURNING instead of rowcount, which only covers execute_values' last page
+        changed = execute_values(cur, """
+            INSERT INTO etl_meta.file_ledger (object_key, etag, size, status, processed_at)
+            SELECT object_key, etag, size, status,
+                   CASE WHEN status = 'processed' THEN CURRENT_TIMESTAMP END
+            FROM (VALUES %s) AS v (object_key, etag, size, status)
+            ON CONFLICT (object_key) DO UPDATE
+            SET etag = EXCLUDED.etag, size = EXCLUDED.size, status = EXCLUDED.status,
+                discovered_at = CURRENT_TIMESTAMP, processed_at = EXCLUDED.processed_at
+            WHERE file_ledger.etag IS DISTINCT FROM EXCLUDED.etag
+            RETURNING object_key
+        """, [(key, etag, size, status) for key, etag, size in objects], fetch=True)
+        return len(changed)
+
+# Statuses: pending (seen, not loaded), loaded (in the database, not yet copied to the
+# processed bucket), processed, failed (retried like pending)
+def _files_with_status(conn, statuses):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT object_key FROM etl_meta.file_ledger
+            WHERE status = ANY(%s)
+            ORDER BY object_key
+        """, (list(statuses),))
+        return [row[0] for row in cur.fetchall()]
+
+def pending_files(conn):
+    return _files_with_status(conn, ["pending", "failed"])
+
+def loaded_files(conn):
+    return _files_with_status(conn, ["loaded"])
+
+def mark_files(conn, keys, status):
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE etl_meta.file_ledger
+            SET status = %s,
+                processed_at = CASE WHEN %s = 'processed' THEN CURRENT_TIMESTAMP END
+            WHERE object_key = ANY(%s)
+        """, (status, status, list(keys)))
+
+# Forgets every file, for when the buckets are emptied and the ledger would point at nothing
+def clear_ledger(conn):
+    ensure_ledger(conn)
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE etl_meta.file_ledger")
@@ -0,0 +1,97 @@
+import os
+import re
+import hashlib
+from config import SCHEMAS, MIGRATIONS_DIR, CREATE_ETL_META_TABLES_PATH
+
+# db/migrations/NNNN_description.sql, templated with {{schema}} and applied to every schema
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Returns the migration files as (version, name, sql), in version order."""
+    migrations = []
+    for file_name in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(file_name)
+        if not match:
+            continue
+        with open(os.path.join(directory, file_name), "r") as f:
+            migrations.append((int(match.group(1)), match.group(2), f.read()))
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+def sql_checksum(sql):
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+# The whole catalog state in one query: {schema: {tables}} for the schemas that exist
+def read_catalog(cur, schemas):
+    cur.execute("""
+        SELECT n.nspname, c.relname
+        FROM pg_namespace n
+        LEFT JOIN pg_class c ON c.relnamespace = n.oid AND c.relkind IN ('r', 'p')
+        WHERE n.nspname = ANY(%s)
+    """, (list(schemas),))
+    catalog = {}
+    for schema, table in cur.fetchall():
+        tables = catalog.setdefault(schema, set())
+        if table:
+            tables.add(table)
+    return catalog
+
+# {schema: {version: checksum}} from the history table
+def applied_migrations(cur):
+    cur.execute("SELECT schema_name, version, checksum FROM etl_meta.schema_migrations")
+    applied = {}
+    for schema, version, checksum in cur.fetchall():
+        applied.setdefault(schema, {})[version] = checksum
+    return applied
+
+def migrate(conn, schemas=SCHEMAS):
+    """
+    Applies every pending migration to every schema in one transaction, so a failing
+    migration leaves all schemas as they were. A schema that does not exist (first run,
+    or dropped since) gets all migrations, whatever its stale history says.
+    Returns the number of (schema, migration) pairs applied.
+    """
+    migrations = load_migrations()
+    applied_count = 0
+
+    with conn.cursor() as cur:
+        # one migrator at a time, the lock is released with the transaction
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('etl_meta.schema_migrations'))")
+
+        # pipeline bookkeeping, including the history table itself
+        with open(CREATE_ETL_META_TABLES_PATH, "r") as f:
+            cur.execute(f.read())
+
+        catalog = read_catalog(cur, schemas)
+        history = applied_migrations(cur)
+
+        for schema in schemas:
+            if schema in catalog:
+                applied = history.get(schema, {})
+                print(f"Schema '{schema}' exists ({len(catalog[schema])} tables).")
+            else:
+                cur.execute(f"CREATE SCHEMA {schema}")
+                cur.execute("DELETE FROM etl_meta.schema_migrations WHERE schema_name = %s", (schema,))
+                applied = {}
+                print(f"Schema '{schema}' created.")
+
+            for version, name, sql in migrations:
+                checksum = sql_checksum(sql)
+                if version in applied:
+                    if applied[version] != checksum:
+                        print(f"⚠️ Migration {version:04d}_{name} was edited after it was applied to '{schema}'.")
+                    continue
+
+                cur.execute(sql.replace("{{schema}}", schema))
+                cur.execute("""
+                    INSERT INTO etl_meta.schema_migrations (schema_name, version, name, checksum)
+                    VALUES (%s, %s, %s, %s)
+                """, (schema, version, name, checksum))
+                print(f"Applied migration {version:04d}_{name} to '{schema}'.")
+                applied_count += 1
+
+    conn.commit()
+    return applied_count
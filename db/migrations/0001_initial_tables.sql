@@ -1,16 +1,18 @@
-CREATE TABLE {{schema}}.product_categories (
+-- Baseline tables. IF NOT EXISTS, so deployments created before migrations adopt it as is
+
+CREATE TABLE IF NOT EXISTS {{schema}}.product_categories (
     category_id SERIAL PRIMARY KEY,
     product_category TEXT,
     inserted_at TIMESTAMP
 );
 
-CREATE TABLE {{schema}}.product_subcategories (
+CREATE TABLE IF NOT EXISTS {{schema}}.product_subcategories (
     subcategory_id SERIAL PRIMARY KEY,
     product_subcategory TEXT,
     inserted_at TIMESTAMP
 );
 
-CREATE TABLE {{schema}}.products (
+CREATE TABLE IF NOT EXISTS {{schema}}.products (
     product_id SERIAL PRIMARY KEY,
     product TEXT,
     brand_name TEXT,
@@ -19,7 +21,7 @@ CREATE TABLE {{schema}}.products (
     inserted_at TIMESTAMP
 );
 
-CREATE TABLE {{schema}}.customers (
+CREATE TABLE IF NOT EXISTS {{schema}}.customers (
     customer_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     customer_firstname TEXT,
     customer_lastname TEXT,
@@ -40,7 +42,7 @@ CREATE TABLE {{schema}}.customers (
     )
 );
 
-CREATE TABLE {{schema}}.stores (
+CREATE TABLE IF NOT EXISTS {{schema}}.stores (
     store_id SERIAL PRIMARY KEY,
     store_type TEXT,
     store_street TEXT,
@@ -49,7 +51,7 @@ CREATE TABLE {{schema}}.stores (
     inserted_at TIMESTAMP
 );
 
-CREATE TABLE {{schema}}.employees (
+CREATE TABLE IF NOT EXISTS {{schema}}.employees (
     employee_id SERIAL PRIMARY KEY,
     employee_firstname TEXT,
     employee_lastname TEXT,
@@ -59,19 +61,19 @@ CREATE TABLE {{schema}}.employees (
     inserted_at TIMESTAMP
 );
 
-CREATE TABLE {{schema}}.payment_methods (
+CREATE TABLE IF NOT EXISTS {{schema}}.payment_methods (
     payment_method_id SERIAL PRIMARY KEY,
     payment_method TEXT,
     inserted_at TIMESTAMP
 );
 
-CREATE TABLE {{schema}}.shipping_methods (
+CREATE TABLE IF NOT EXISTS {{schema}}.shipping_methods (
     shipping_method_id SERIAL PRIMARY KEY,
     shipping_method TEXT,
     inserted_at TIMESTAMP
 );
 
-CREATE TABLE {{schema}}.sales (
+CREATE TABLE IF NOT EXISTS {{schema}}.sales (
     transaction_id SERIAL PRIMARY KEY,
     tmstmp TIMESTAMP,
     product_id INT REFERENCES {{schema}}.products(product_id),
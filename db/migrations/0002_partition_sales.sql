@@ -0,0 +1,98 @@
+-- Sales becomes range partitioned by month on tmstmp. Unique keys of a partitioned table
+-- must contain tmstmp: the primary key becomes (transaction_id, tmstmp), the
+-- (customer_id, tmstmp) key the upserts conflict on already does
+
+-- Keep the old table (and its id sequence) aside until the rows are copied
+ALTER TABLE {{schema}}.sales RENAME TO sales_unpartitioned;
+ALTER TABLE {{schema}}.sales_unpartitioned RENAME CONSTRAINT sales_pkey TO sales_unpartitioned_pkey;
+ALTER TABLE {{schema}}.sales_unpartitioned RENAME CONSTRAINT unique_customer_timestamp TO unique_customer_timestamp_unpartitioned;
+ALTER SEQUENCE {{schema}}.sales_transaction_id_seq OWNED BY NONE;
+
+CREATE TABLE {{schema}}.sales (
+    transaction_id INT NOT NULL DEFAULT nextval('{{schema}}.sales_transaction_id_seq'),
+    tmstmp TIMESTAMP,
+    product_id INT REFERENCES {{schema}}.products(product_id),
+    customer_id INT REFERENCES {{schema}}.customers(customer_id),
+    store_id INT REFERENCES {{schema}}.stores(store_id),
+    employee_id INT REFERENCES {{schema}}.employees(employee_id),
+    payment_method_id INT REFERENCES {{schema}}.payment_methods(payment_method_id),
+    shipping_method_id INT REFERENCES {{schema}}.shipping_methods(shipping_method_id),
+    product_price NUMERIC,
+    coupon_discount NUMERIC,
+    quantity_sold INT,
+    total_amount NUMERIC,
+    total_costs NUMERIC,
+    sales_channel TEXT,
+    store_website TEXT,
+    supplier TEXT,
+    inserted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (transaction_id, tmstmp),
+    -- Unique constraint for deduplication
+    CONSTRAINT unique_customer_timestamp UNIQUE (
+        customer_id, tmstmp
+    )
+) PARTITION BY RANGE (tmstmp);
+
+ALTER SEQUENCE {{schema}}.sales_transaction_id_seq OWNED BY {{schema}}.sales.transaction_id;
+
+-- Rows outside every month partition land here (tmstmp is part of the key, never NULL)
+CREATE TABLE {{schema}}.sales_default PARTITION OF {{schema}}.sales DEFAULT;
+
+-- Indexes on the parent are created on every partition, existing and future.
+-- BRIN for time ranges (rows arrive in time order, so it stays tiny), B-tree for the
+-- dimension filters; customer_id is already the leading column of the unique key
+CREATE INDEX sales_tmstmp_brin ON {{schema}}.sales USING brin (tmstmp);
+CREATE INDEX sales_product_id_idx ON {{schema}}.sales (product_id);
+CREATE INDEX sales_store_id_idx ON {{schema}}.sales (store_id);
+CREATE INDEX sales_employee_id_idx ON {{schema}}.sales (employee_id);
+CREATE INDEX sales_payment_method_id_idx ON {{schema}}.sales (payment_method_id);
+CREATE INDEX sales_shipping_method_id_idx ON {{schema}}.sales (shipping_method_id);
+
+-- Creates the monthly partitions sales_YYYY_MM covering [from_ts, to_ts] that do not exist yet,
+-- returns how many were created. The ETL calls it before every sales upsert
+CREATE OR REPLACE FUNCTION {{schema}}.ensure_sales_partitions(from_ts TIMESTAMP, to_ts TIMESTAMP)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    month_start TIMESTAMP := date_trunc('month', from_ts);
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    WHILE month_start <= to_ts LOOP
+        partition_name := 'sales_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(format('%I.%I', '{{schema}}', partition_name)) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I.%I PARTITION OF %I.sales FOR VALUES FROM (%L) TO (%L)',
+                '{{schema}}', partition_name, '{{schema}}', month_start, month_start + INTERVAL '1 month'
+            );
+            created := created + 1;
+        END IF;
+        month_start := month_start + INTERVAL '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- Rows without a timestamp cannot go into a table keyed on tmstmp; they are kept aside
+-- in sales_null_tmstmp for inspection instead of failing the copy
+CREATE TABLE {{schema}}.sales_null_tmstmp AS
+SELECT * FROM {{schema}}.sales_unpartitioned WHERE tmstmp IS NULL;
+
+-- Move the existing rows over, ids included
+SELECT {{schema}}.ensure_sales_partitions(MIN(tmstmp), MAX(tmstmp)) FROM {{schema}}.sales_unpartitioned;
+
+INSERT INTO {{schema}}.sales (
+    transaction_id, tmstmp, product_id, customer_id, store_id, employee_id, payment_method_id,
+    shipping_method_id, product_price, coupon_discount, quantity_sold, total_amount, total_costs,
+    sales_channel, store_website, supplier, inserted_at
+)
+SELECT
+    transaction_id, tmstmp, product_id, customer_id, store_id, employee_id, payment_method_id,
+    shipping_method_id, product_price, coupon_discount, quantity_sold, total_amount, total_costs,
+    sales_channel, store_website, supplier, inserted_at
+FROM {{schema}}.sales_unpartitioned
+WHERE tmstmp IS NOT NULL;
+
+DROP TABLE {{schema}}.sales_unpartitioned;
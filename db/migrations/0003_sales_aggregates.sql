@@ -0,0 +1,75 @@
+-- Daily summary tables for the dashboard pages, kept up to date by the ETL: every sales
+-- upsert re-aggregates just the days it touched (refresh_sales_aggregates), so a dashboard
+-- refresh reads one row per day and group instead of every transaction.
+-- scripts/rebuild_aggregates.py rebuilds them from scratch
+
+-- General overview / Overtime top-n / Time comparison: product, store, channel, payment, shipping
+CREATE TABLE IF NOT EXISTS {{schema}}.agg_daily_sales (
+    day DATE NOT NULL,
+    product_id INT,
+    store_id INT,
+    sales_channel TEXT,
+    payment_method_id INT,
+    shipping_method_id INT,
+    transactions INT NOT NULL,
+    customers INT NOT NULL,  -- distinct per day and group, not additive across days
+    quantity_sold BIGINT,
+    total_amount NUMERIC,
+    total_costs NUMERIC
+);
+CREATE INDEX IF NOT EXISTS agg_daily_sales_day_idx ON {{schema}}.agg_daily_sales (day);
+
+-- Map customers: totals per customer state and channel. The state is taken from the
+-- customer at aggregation time, a rebuild picks up later address changes
+CREATE TABLE IF NOT EXISTS {{schema}}.agg_daily_customer_state (
+    day DATE NOT NULL,
+    customer_state TEXT,
+    sales_channel TEXT,
+    transactions INT NOT NULL,
+    customers INT NOT NULL,
+    total_amount NUMERIC,
+    total_costs NUMERIC
+);
+CREATE INDEX IF NOT EXISTS agg_daily_customer_state_day_idx ON {{schema}}.agg_daily_customer_state (day);
+
+-- Replaces the aggregate rows of the given days with fresh ones from sales; the time range
+-- filter lets the planner prune the monthly sales partitions. Returns the number of days
+CREATE OR REPLACE FUNCTION {{schema}}.refresh_sales_aggregates(days DATE[])
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    first_day DATE := (SELECT MIN(d) FROM unnest(days) AS d);
+    last_day DATE := (SELECT MAX(d) FROM unnest(days) AS d);
+BEGIN
+    IF first_day IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    DELETE FROM {{schema}}.agg_daily_sales WHERE day = ANY(days);
+    DELETE FROM {{schema}}.agg_daily_customer_state WHERE day = ANY(days);
+
+    INSERT INTO {{schema}}.agg_daily_sales (
+        day, product_id, store_id, sales_channel, payment_method_id, shipping_method_id,
+        transactions, customers, quantity_sold, total_amount, total_costs
+    )
+    SELECT s.tmstmp::date, s.product_id, s.store_id, s.sales_channel, s.payment_method_id,
+           s.shipping_method_id, COUNT(*), COUNT(DISTINCT s.customer_id), SUM(s.quantity_sold),
+           SUM(s.total_amount), SUM(s.total_costs)
+    FROM {{schema}}.sales s
+    WHERE s.tmstmp >= first_day AND s.tmstmp < last_day + 1 AND s.tmstmp::date = ANY(days)
+    GROUP BY 1, 2, 3, 4, 5, 6;
+
+    INSERT INTO {{schema}}.agg_daily_customer_state (
+        day, customer_state, sales_channel, transactions, customers, total_amount, total_costs
+    )
+    SELECT s.tmstmp::date, c.customer_state, s.sales_channel, COUNT(*),
+           COUNT(DISTINCT s.customer_id), SUM(s.total_amount), SUM(s.total_costs)
+    FROM {{schema}}.sales s
+    LEFT JOIN {{schema}}.customers c ON c.customer_id = s.customer_id
+    WHERE s.tmstmp >= first_day AND s.tmstmp < last_day + 1 AND s.tmstmp::date = ANY(days)
+    GROUP BY 1, 2, 3;
+
+    RETURN array_length(days, 1);
+END;
+$$;
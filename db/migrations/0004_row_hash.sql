@@ -0,0 +1,5 @@
+-- md5 of the upserted columns, written by the COPY merge (db/bulk_upsert.py). A conflicting
+-- row whose hash did not change is left alone, so replaying a loaded day writes nothing.
+-- Rows loaded before this column existed get their hash on their next upsert
+ALTER TABLE {{schema}}.customers ADD COLUMN IF NOT EXISTS row_hash TEXT;
+ALTER TABLE {{schema}}.sales ADD COLUMN IF NOT EXISTS row_hash TEXT;
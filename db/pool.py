@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import ThreadedConnectionPool
+from metrics import add_db_round_trip
+from db.connection import connection_params
+from config import DB_POOL_MIN, DB_POOL_MAX, DB_SYNCHRONOUS_COMMIT, DB_STATEMENT_TIMEOUT_MS,\
+                   DB_HEALTHCHECK_IDLE_SECONDS, DB_CONNECT_RETRIES, DB_CONNECT_BACKOFF
+
+# Counts every statement and COPY as one database round trip for the stage metrics
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        add_db_round_trip()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        add_db_round_trip()
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        add_db_round_trip()
+        return super().copy_expert(sql, file, size)
+
+_pool = None
+_pool_lock = threading.Lock()
+_last_used = {}  # id(conn) -> time.monotonic() when it was last returned to the pool
+
+# Session settings sent in the startup packet, so every pooled connection gets them once
+def session_options():
+    return (f"-c synchronous_commit={DB_SYNCHRONOUS_COMMIT} "
+            f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}")
+
+# Retries with exponential backoff and jitter, so a Postgres restart does not
+# turn into every stage reconnecting at the same moment
+def _with_retry(connect):
+    for attempt in range(1, DB_CONNECT_RETRIES + 1):
+        try:
+            return connect()
+        except psycopg2.OperationalError as e:
+            if attempt == DB_CONNECT_RETRIES:
+                raise
+            delay = DB_CONNECT_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            print(f"Database not reachable ({e.__class__.__name__}), retry {attempt} in {delay:.1f}s...")
+            time.sleep(delay)
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = _with_retry(lambda: ThreadedConnectionPool(
+                DB_POOL_MIN, DB_POOL_MAX, options=session_options(), cursor_factory=CountingCursor,
+                **connection_params()
+            ))
+        return _pool
+
+# A connection that sat idle may have been cut by a server restart; ping it before handing it out
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_HEALTHCHECK_IDLE_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _discard(pool, conn):
+    _last_used.pop(id(conn), None)
+    pool.putconn(conn, close=True)
+
+# Borrows a connection from the shared pool. Like `with psycopg2.connect() as conn`, the
+# transaction is committed on success and rolled back on error; broken connections are
+# closed instead of going back to the pool
+@contextmanager
+def pooled_connection():
+    pool = get_pool()
+    conn = _with_retry(pool.getconn)
+    while not _is_healthy(conn):
+        print("Dropping a dead pooled connection, reconnecting...")
+        _discard(pool, conn)
+        conn = _with_retry(pool.getconn)
+
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        raise
+    finally:
+        if conn.closed or conn.info.transaction_status == TRANSACTION_STATUS_UNKNOWN:
+            _discard(pool, conn)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn)
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _last_used.clear()
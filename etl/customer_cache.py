@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import pandas as pd
+from config import BASE_COLS, CUSTOMER_ID_COLUMNS, CUSTOMER_CACHE_PATH, ROW_HASH_COLUMN
+from db.bulk_upsert import staging_table, merge_staging
+from etl.dim_cache import key_hashes
+
+# Content hash and id of every customer already in prod.customers, kept in a local sqlite
+# file and in memory, so transform_customers only hands the customers that are new or changed
+# to the upsert. The cache remembers the highest customer_id it has seen; when prod.customers
+# disagrees (first start, truncated tables, another writer) it is reconciled from the database.
+# Customers read back from the database have no hash yet and count as changed once.
+# Replica schemas only receive what the delta sends, so sync also checks that they still hold
+# every customer of the source as it is there, and refills them from the source when they do not
+class CustomerDeltaCache:
+    def __init__(self, path=CUSTOMER_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._hashes = {}  # customer_email -> content hash, None when not known yet
+        self._ids = {}     # customer_email -> customer_id
+        self._max_id = None
+        self._pending = {}  # hashes of the customers sent in the open batch
+
+    def _open(self):
+        if self._db is not None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS customers (email TEXT PRIMARY KEY, hash INTEGER, customer_id INTEGER);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+        """)
+        for email, content_hash, customer_id in self._db.execute("SELECT email, hash, customer_id FROM customers"):
+            self._hashes[email] = content_hash
+            self._ids[email] = customer_id
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'max_customer_id'").fetchone()
+        self._max_id = row[0] if row else None
+        print(f"Customer cache: loaded {len(self._hashes)} customers from {self.path}")
+
+    def _save(self, rows):
+        self._db.executemany("INSERT OR REPLACE INTO customers (email, hash, customer_id) VALUES (?, ?, ?)", rows)
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('max_customer_id', ?)", (self._max_id,))
+        self._db.commit()
+
+    # A replica that lost or changed customers (e.g. truncated or edited on its own) would never
+    # get the unchanged ones back through the delta. The source customers it misses, or holds with
+    # other content, are staged server-side and upserted into it with their source row hash.
+    # Customers only the replica has are reported, not deleted: its sales may reference them
+    def _refill_replica(self, conn, schema, replica):
+        columns = BASE_COLS + [ROW_HASH_COLUMN]
+        differs = " OR ".join(f"source.{col} IS DISTINCT FROM copy.{col}" for col in BASE_COLS)
+        staging = staging_table(replica, "customers")
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT COUNT(*) FROM {replica}.customers AS copy
+                WHERE NOT EXISTS (SELECT 1 FROM {schema}.customers AS source
+                                  WHERE source.customer_email = copy.customer_email)
+            """)
+            extra = cur.fetchone()[0]
+            if extra:
+                print(f"Customer cache: {replica}.customers has {extra} customers {schema}.customers does not")
+
+            cur.execute(f"DROP TABLE IF EXISTS {staging}")
+            cur.execute(f"""
+                CREATE TEMP TABLE {staging} ON COMMIT DROP AS
+                SELECT {', '.join(f'source.{col}' for col in columns)}
+                FROM {schema}.customers AS source
+                LEFT JOIN {replica}.customers AS copy ON copy.customer_email = source.customer_email
+                WHERE copy.customer_email IS NULL OR {differs}
+            """)
+            if cur.rowcount == 0:
+                return
+            print(f"Customer cache: {replica}.customers misses or differs on {cur.rowcount} "
+                  f"customers of {schema}.customers, refilling...")
+            inserted, updated, _ = merge_staging(cur, staging, replica, "customers", columns, ["customer_email"])
+        conn.commit()
+        print(f"Customer cache: refilled {replica}.customers, inserted: {inserted}, updated: {updated}")
+
+    # Cheap queries per cycle; a full read of (email, id) only when the cache is out of sync
+    def sync(self, conn, schema="prod", replicas=()):
+        self._open()
+        for replica in replicas:
+            self._refill_replica(conn, schema, replica)
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT MAX(customer_id) FROM {schema}.customers")
+            max_id = cur.fetchone()[0]
+            if max_id == self._max_id:
+                return
+            print(f"Customer cache: out of sync with {schema}.customers, reconciling...")
+            cur.execute(f"SELECT customer_email, customer_id FROM {schema}.customers")
+            rows = cur.fetchall()
+
+        self._hashes = {email: None for email, _ in rows}
+        self._ids = dict(rows)
+        self._max_id = max_id
+        self._db.execute("DELETE FROM customers")
+        self._save([(email, None, customer_id) for email, customer_id in rows])
+        print(f"Customer cache: reconciled {len(rows)} customers")
+
+    # Keeps only the customers whose content hash is new or changed; the others are counted as hits
+    def delta(self, customers: pd.DataFrame) -> pd.DataFrame:
+        self._open()
+        hashes = key_hashes(customers, BASE_COLS).astype("int64")  # sqlite integers are signed
+        emails = customers["customer_email"]
+        unchanged = pd.Series(
+            [self._hashes.get(email) == content_hash for email, content_hash in zip(emails, hashes)],
+            index=customers.index, dtype=bool
+        )
+
+        hits = int(unchanged.sum())
+        self.hits += hits
+        self.misses += len(customers) - hits
+        total = self.hits + self.misses
+        print(f"Customer cache: {hits}/{len(customers)} unchanged this batch, "
+              f"hit rate {self.hits / total:.0%} overall" if total else "Customer cache: empty batch")
+
+        changed = ~unchanged
+        self._pending = dict(zip(emails[changed], hashes[changed].tolist()))
+        return customers[changed]
+
+    # (customer_email, customer_id) of the given emails whose id the cache knows
+    def known_ids(self, emails) -> pd.DataFrame:
+        pairs = [(email, self._ids[email]) for email in emails if self._ids.get(email) is not None]
+        return pd.DataFrame(pairs, columns=CUSTOMER_ID_COLUMNS)
+
+    # Called after the batch committed, with the ids the prod upsert returned
+    def commit(self, returned_ids: pd.DataFrame):
+        returned = dict(zip(returned_ids["customer_email"], returned_ids["customer_id"]))
+        rows = []
+        for email, content_hash in self._pending.items():
+            customer_id = returned.get(email, self._ids.get(email))
+            self._hashes[email] = content_hash
+            self._ids[email] = customer_id
+            rows.append((email, content_hash, None if customer_id is None else int(customer_id)))
+        if returned:
+            newest = int(max(returned.values()))
+            self._max_id = newest if self._max_id is None else max(self._max_id, newest)
+        self._save(rows)
+        self._pending = {}
+
+    # The batch rolled back: nothing it sent is in the database
+    def discard(self):
+        self._pending = {}
+
+
+# Lives for the whole process, like DIMENSION_CACHE
+CUSTOMER_CACHE = CustomerDeltaCache()
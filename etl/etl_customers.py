@@ -1,18 +1,27 @@
 import pandas as pd
 import re
-from config import BASE_COLS
+from config import BASE_COLS, CUSTOMER_ID_COLUMNS, ROW_HASH_COLUMN, TRANSFORM_WORKERS
+from db.bulk_upsert import copy_upsert, replicate_upsert
+from storage.formats import concat_frames
+from etl.parallel import use_pool, number_rows, map_days
 
 def normalize_phone(phone):
     digits = re.sub(r"\D", "", str(phone))
     return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}" if len(digits) == 10 else phone
 
-# Processes 2 dfs online and offline
-def transform_customers(online_df: pd.DataFrame, offline_df: pd.DataFrame) -> pd.DataFrame:
+# Column-wise normalize_phone: same result for every value, without a Python call per row
+def normalize_phones(phones: pd.Series) -> pd.Series:
+    digits = phones.astype(str).str.replace(r"\D", "", regex=True)
+    formatted = digits.str[:3] + "-" + digits.str[3:6] + "-" + digits.str[6:]
+    return phones.where(digits.str.len() != 10, formatted)
+
+# Customer columns of both feeds with normalized phones, rows keep their index labels
+def customer_rows(online_df: pd.DataFrame, offline_df: pd.DataFrame):
     c_online_df = online_df.copy()
     c_offline_df = offline_df.copy()
 
     # Online
-    c_online_df["customer_phone"] = c_online_df["customer_phone"].apply(normalize_phone)
+    c_online_df["customer_phone"] = normalize_phones(c_online_df["customer_phone"])
     c_online_df = c_online_df[BASE_COLS]
 
     # Offline
@@ -24,47 +33,68 @@ def transform_customers(online_df: pd.DataFrame, offline_df: pd.DataFrame) -> pd
         customer_city=c_offline_df["store_city"],
         customer_state=c_offline_df["store_state"]
     )
-    c_offline_df["customer_phone"] = c_offline_df["customer_phone"].apply(normalize_phone)
+    c_offline_df["customer_phone"] = normalize_phones(c_offline_df["customer_phone"])
     c_offline_df = c_offline_df[BASE_COLS]
+    return c_online_df, c_offline_df
+
+# One customer per email, the last one in feed order (online rows, then offline rows); the sort
+# is stable so that "last" does not depend on how the rows were split up
+def dedupe_customers(customers: pd.DataFrame) -> pd.DataFrame:
+    return (customers.sort_values(by=["customer_email"], kind="stable")
+                     .drop_duplicates(subset=["customer_email"], keep="last"))
+
+# Worker task of the parallel transform: the day's customers, already deduplicated within the day
+def customers_of_day(online_day: pd.DataFrame, offline_day: pd.DataFrame) -> pd.DataFrame:
+    c_online_df, c_offline_df = customer_rows(online_day, offline_day)
+    day = concat_frames([c_online_df, c_offline_df], ignore_index=False)
+    return day[~day["customer_email"].duplicated(keep="last")]
+
+# Processes 2 dfs online and offline, for a large batch one calendar day per worker process.
+# With a delta_cache (etl/customer_cache.py) only the customers that are new or changed since
+# they were last loaded are returned
+def transform_customers(online_df: pd.DataFrame, offline_df: pd.DataFrame, delta_cache=None,
+                        workers=TRANSFORM_WORKERS) -> pd.DataFrame:
+    if use_pool(online_df, offline_df, workers):
+        # the days come back with their feed positions; in that order the cross-day dedup
+        # keeps the same customer rows as the single-process path
+        days = map_days(customers_of_day, *number_rows(online_df, offline_df), workers=workers)
+        customers = concat_frames(days, ignore_index=False).sort_index(kind="stable")
+    else:
+        customers = concat_frames(customer_rows(online_df, offline_df))
 
-    # Combine and deduplicate
-    return (pd.concat([c_online_df, c_offline_df], ignore_index=True)
-              .sort_values(by=["customer_email"])
-              .drop_duplicates(subset=["customer_email"], keep="last"))
+    customers = dedupe_customers(customers)
+    return delta_cache.delta(customers) if delta_cache is not None else customers
 
-# Upserts new customers to customers table in 2 schemas
-def upsert_customers(df, conn, schema):
+# Upserts new customers to the customers table of one schema; customers whose row hash did not
+# change are not rewritten. Returns (customer_email, customer_id) of the inserted and changed
+# customers, transform_sales looks the unchanged ones up in one query
+def upsert_customers(df, conn, schema, commit=True) -> pd.DataFrame:
     if df.empty:
         print(f"No customer records to insert for schema '{schema}'.")
-        return
+        return pd.DataFrame(columns=CUSTOMER_ID_COLUMNS)
 
-    columns = list(df.columns)
-    placeholders = ', '.join(['%s'] * len(columns))
-    col_str = ', '.join(columns)
-
-    update_str = ', '.join([
-        f"{col} = EXCLUDED.{col}"
-        for col in columns
-        if col != 'customer_email'  # Do not update the unique key
-    ])
+    # customer_email is the unique key, it is never updated
+    result = copy_upsert(
+        df, conn, schema, "customers",
+        conflict_keys=["customer_email"], returning=CUSTOMER_ID_COLUMNS, commit=commit,
+        hash_column=ROW_HASH_COLUMN
+    )
 
-    newly_inserted_count = 0
+    print(f"Upserted {result.sent} records into {schema}.customers")
+    print(f"Newly inserted: {result.inserted}, updated: {result.updated}, unchanged: {result.unchanged}")
+    return result.returned
 
-    with conn.cursor() as cur:
-        for row in df.itertuples(index=False, name=None):
-            sql = f"""
-                INSERT INTO {schema}.customers ({col_str})
-                VALUES ({placeholders})
-                ON CONFLICT (customer_email) DO UPDATE SET {update_str}
-                RETURNING xmax = 0;
-            """
-            cur.execute(sql, row)
-            # In PostgreSQL, xmax = 0 means the row is newly inserted
-            is_inserted = cur.fetchone()[0]
-            if is_inserted:
-                newly_inserted_count += 1
+# Applies the customers just upserted into source_schema (with commit=False) to another schema,
+# server-side from the source's staging table; ids are that schema's own, nothing is returned.
+# With the delta cache only new and changed customers are staged, customers the replica lost
+# come back through CUSTOMER_CACHE.sync
+def replicate_customers(df, conn, schema, source_schema="prod", commit=True):
+    if df.empty:
+        return None
 
-        conn.commit()
+    result = replicate_upsert(conn, source_schema, schema, "customers", conflict_keys=["customer_email"],
+                              commit=commit, hash_column=ROW_HASH_COLUMN)
 
-    print(f"Upserted {len(df)} records into {schema}.customers")
-    print(f"Newly inserted: {newly_inserted_count}")
\ No newline at end of file
+    print(f"Replicated {result.sent} records from {source_schema}.customers into {schema}.customers")
+    print(f"Newly inserted: {result.inserted}, updated: {result.updated}, unchanged: {result.unchanged}")
+    return result
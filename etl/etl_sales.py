@@ -1,11 +1,44 @@
+import time
 import pandas as pd
 from config import OFFLINE_COLUMNS_TO_STANDARDISE, ONLINE_COLUMNS_TO_STANDARDISE,\
-                    OFFLINE_SALES_CHANNEL, ONLINE_SALES_CHANNEL, TMSTMP, DIM_TABLES,\
-                    SALES_COLUMN_ORDER
+                    OFFLINE_SALES_CHANNEL, ONLINE_SALES_CHANNEL, TMSTMP,\
+                    SALES_COLUMN_ORDER, CUSTOMER_ID_COLUMNS, API_NOTIFY_CHANNEL, ROW_HASH_COLUMN,\
+                    SALES_CONFLICT_KEYS, TRANSFORM_WORKERS
+from db.bulk_upsert import copy_upsert, replicate_upsert
+from etl.dim_cache import DIMENSION_CACHE, resolve_ids
+from etl.parallel import use_pool, map_days
+from storage.formats import concat_frames
                     
-# Processes 2 dfs online and offline
-def transform_sales(online_df: pd.DataFrame, offline_df: pd.DataFrame, conn, schema) -> pd.DataFrame:
-
+# Maps customer emails to ids: first from the (customer_email, customer_id) pairs the customer
+# upsert returned, then with one targeted lookup for any email the batch did not cover
+def resolve_customer_ids(emails: pd.Series, customer_ids, conn, schema) -> pd.Series:
+    if customer_ids is None:
+        customer_ids = pd.DataFrame(columns=CUSTOMER_ID_COLUMNS)
+
+    known = customer_ids.drop_duplicates(subset="customer_email").set_index("customer_email")["customer_id"]
+    missing = pd.Index(emails.dropna().unique()).difference(known.index)
+
+    if len(missing) > 0:
+        looked_up = pd.read_sql(
+            f"SELECT customer_email, customer_id FROM {schema}.customers WHERE customer_email = ANY(%s)",
+            conn, params=(list(missing),)
+        )
+        print(f"Looked up {len(looked_up)} of {len(missing)} customer ids not returned by the upsert")
+        known = pd.concat([known, looked_up.set_index("customer_email")["customer_id"]])
+
+    return emails.map(known).astype("Int64")
+
+# final touches: offline sales have no coupon and are shipped with method 5
+def apply_offline_defaults(combined_df: pd.DataFrame) -> pd.DataFrame:
+    offline = combined_df['sales_channel'] == OFFLINE_SALES_CHANNEL
+    combined_df['coupon_discount'] = combined_df['coupon_discount'].where(~offline).astype(float).mask(offline, 0.0)
+    combined_df['shipping_method_id'] = combined_df['shipping_method_id'].mask(offline, 5)
+    return combined_df
+
+# Combines the 2 dfs online and offline into sales rows in tmstmp order with their dimension ids
+# from the `lookups` hash maps (DimensionCache.lookups). Needs no database, so it also runs
+# as the per-day task of the parallel transform
+def sales_rows(online_df: pd.DataFrame, offline_df: pd.DataFrame, lookups) -> pd.DataFrame:
     s_online_df = online_df.copy()
     s_offline_df = offline_df.copy()
 
@@ -22,78 +55,125 @@ def transform_sales(online_df: pd.DataFrame, offline_df: pd.DataFrame, conn, sch
     for col in missing_columns:
         s_online_df[col] = None  # Fill missing columns in online with None
 
-    # Add a sales channel column
-    s_online_df['sales_channel'] = ONLINE_SALES_CHANNEL
-    s_offline_df['sales_channel'] = OFFLINE_SALES_CHANNEL
+    # Add a sales channel column, categorical like the other low-cardinality text
+    channels = pd.CategoricalDtype([ONLINE_SALES_CHANNEL, OFFLINE_SALES_CHANNEL])
+    s_online_df['sales_channel'] = pd.Series(ONLINE_SALES_CHANNEL, index=s_online_df.index, dtype=channels)
+    s_offline_df['sales_channel'] = pd.Series(OFFLINE_SALES_CHANNEL, index=s_offline_df.index, dtype=channels)
+
+    # Combine (categoricals stay categorical) and sort; stable, so rows sharing a tmstmp keep
+    # online before offline and the per-day results line up with a sort of the whole batch
+    combined_df = concat_frames([s_online_df, s_offline_df])
 
-    # Combine and sort
-    combined_df = pd.concat([s_online_df, s_offline_df], ignore_index=True)
-    combined_df.sort_values(by=TMSTMP, inplace=True)
+    # sales are partitioned and deduplicated on tmstmp, a row without one cannot be stored
+    no_tmstmp = combined_df[TMSTMP].isna()
+    if no_tmstmp.any():
+        print(f"Dropped {int(no_tmstmp.sum())} sales rows without a timestamp")
+        combined_df = combined_df[~no_tmstmp]
+
+    combined_df.sort_values(by=TMSTMP, inplace=True, kind="stable")
     combined_df.reset_index(drop=True, inplace=True)
 
-    # Read all dimension tables dynamically
-    dim_data = {
-        name: pd.read_sql(f"SELECT {', '.join(cfg['columns'])} FROM {schema}.{name}", conn)
-        for name, cfg in DIM_TABLES.items()
-    }
-
-    # Merge all dimension tables
-    for name, cfg in DIM_TABLES.items():
-        combined_df = combined_df.merge(
-            dim_data[name],
-            on=cfg["join_keys"],
-            how="left"
-        )
+    # Resolve all dimension ids through the cached hash maps, timed for the cache report
+    start = time.perf_counter()
+    combined_df = resolve_ids(combined_df, lookups)
+    resolve_ms = (time.perf_counter() - start) * 1000
 
     # replace store_id with 8 for Online stores
     combined_df.loc[combined_df['sales_channel'] == 'Online', 'store_id'] = 8
 
-    # final touches
-    combined_df['coupon_discount'] = combined_df.apply(
-    lambda row: 0 if row['sales_channel'] == OFFLINE_SALES_CHANNEL else float(row['coupon_discount']),
-    axis=1)
-
-    combined_df['shipping_method_id'] = combined_df.apply(
-    lambda row: 5 if row['sales_channel'] == OFFLINE_SALES_CHANNEL else row['shipping_method_id'],
-    axis=1)
-
-    return combined_df[SALES_COLUMN_ORDER].where(pd.notnull(combined_df), None)
+    combined_df = apply_offline_defaults(combined_df)
+
+    # customer_id is resolved from the email once the days are combined
+    rows = combined_df[[col for col in SALES_COLUMN_ORDER if col != "customer_id"] + ["customer_email"]]
+    rows.attrs["resolve_ms"] = resolve_ms
+    return rows
+
+# Processes 2 dfs online and offline, for a large batch one calendar day per worker process
+def transform_sales(online_df: pd.DataFrame, offline_df: pd.DataFrame, conn, schema,
+                    customer_ids: pd.DataFrame = None, workers=TRANSFORM_WORKERS) -> pd.DataFrame:
+    # dimension tables are re-read only when they change, and go to the workers as they are
+    lookups = DIMENSION_CACHE.lookups(conn, schema)
+
+    if use_pool(online_df, offline_df, workers):
+        # days come back in date order, so their concat is in tmstmp order like one sorted frame
+        days = map_days(sales_rows, online_df, offline_df, lookups, workers=workers)
+        resolve_ms = sum(day.attrs["resolve_ms"] for day in days)  # summed over the workers
+        combined_df = concat_frames(days)
+    else:
+        combined_df = sales_rows(online_df, offline_df, lookups)
+        resolve_ms = combined_df.attrs["resolve_ms"]
+    DIMENSION_CACHE.report(len(combined_df), resolve_ms)
+
+    # Resolve customers from the ids the customer upsert returned
+    combined_df["customer_id"] = resolve_customer_ids(combined_df["customer_email"], customer_ids, conn, schema)
+
+    # Missing values stay NA in their typed columns, the COPY upsert writes them as NULL
+    return combined_df[SALES_COLUMN_ORDER]
+
+# sales is partitioned by month (db/migrations/0002); creates the partitions the batch needs
+def ensure_sales_partitions(df, conn, schema):
+    tmstmps = df[TMSTMP].dropna()
+    if tmstmps.empty:
+        return
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT {schema}.ensure_sales_partitions(%s, %s)",
+            (tmstmps.min().to_pydatetime(), tmstmps.max().to_pydatetime())
+        )
+        created = cur.fetchone()[0]
+    if created:
+        print(f"Created {created} monthly partitions of {schema}.sales")
+
+# Re-aggregates the dashboard summary tables for the days this batch touched, in the
+# same transaction as the upsert
+def refresh_aggregates(df, conn, schema):
+    days = sorted(df[TMSTMP].dropna().dt.date.unique())
+    if not days:
+        return
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {schema}.refresh_sales_aggregates(%s::date[])", (days,))
+        # delivered on commit only, tells the read API to drop its cached results
+        cur.execute("SELECT pg_notify(%s, %s)", (API_NOTIFY_CHANNEL, f"{schema}:{days[0]}:{days[-1]}"))
+    print(f"Refreshed {schema} aggregates for {len(days)} days")
 
-# Upserts new customers to customers table in 2 schemas
-def upsert_sales(df, conn, schema):
+# Upserts new sales to the sales table of one schema
+def upsert_sales(df, conn, schema, commit=True):
     if df.empty:
         print(f"No sales records to insert for schema '{schema}'.")
-        return
+        return None
 
-    columns = list(df.columns)
-    placeholders = ', '.join(['%s'] * len(columns))
-    col_str = ', '.join(columns)
+    ensure_sales_partitions(df, conn, schema)
 
-    # Build UPDATE SET clause, excluding conflict keys
-    update_str = ', '.join([
-        f"{col} = EXCLUDED.{col}"
-        for col in columns
-        if col not in ('customer_id', 'tmstmp')  # do not update the conflict keys
-    ])
+    # (customer_id, tmstmp) is the conflict key, it is never updated
+    result = copy_upsert(df, conn, schema, "sales", conflict_keys=SALES_CONFLICT_KEYS, commit=False,
+                         hash_column=ROW_HASH_COLUMN)
+    # a replay that changed nothing leaves the aggregates (and the API caches) alone
+    if result.inserted or result.updated:
+        refresh_aggregates(df, conn, schema)
+    if commit:
+        conn.commit()
 
-    newly_inserted_count = 0
+    print(f"Upserted {result.sent} records into {schema}.sales")
+    print(f"Newly inserted: {result.inserted}, updated: {result.updated}, unchanged: {result.unchanged}")
+    return result
 
-    with conn.cursor() as cur:
-        for row in df.itertuples(index=False, name=None):
-            sql = f"""
-                INSERT INTO {schema}.sales ({col_str})
-                VALUES ({placeholders})
-                ON CONFLICT (customer_id, tmstmp) DO UPDATE
-                SET {update_str}
-                RETURNING xmax = 0;
-            """
-            cur.execute(sql, row)
-            # In PostgreSQL, xmax = 0 means it was inserted, not updated
-            is_inserted = cur.fetchone()[0]
-            if is_inserted:
-                newly_inserted_count += 1
+# Applies the sales just upserted into source_schema (with commit=False) to another schema,
+# server-side from the source's staging table; df is only used for the partitions and the days.
+# Every schema numbers its customers itself, so customer_id is mapped through customer_email
+def replicate_sales(df, conn, schema, source_schema="prod", commit=True):
+    if df.empty:
+        return None
+
+    ensure_sales_partitions(df, conn, schema)
 
+    result = replicate_upsert(conn, source_schema, schema, "sales", conflict_keys=SALES_CONFLICT_KEYS,
+                              commit=False, hash_column=ROW_HASH_COLUMN,
+                              id_maps={"customer_id": ("customers", "customer_email")})
+    if result.inserted or result.updated:
+        refresh_aggregates(df, conn, schema)
+    if commit:
         conn.commit()
 
-    print(f"Upserted {len(df)} records into {schema}.sales")
-    print(f"Newly inserted: {newly_inserted_count}")
\ No newline at end of file
+    print(f"Replicated {result.sent} records from {source_schema}.sales into {schema}.sales")
+    print(f"Newly inserted: {result.inserted}, updated: {result.updated}, unchanged: {result.unchanged}")
+    return result
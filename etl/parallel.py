@@ -0,0 +1,62 @@
+import atexit
+import multiprocessing
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from config import TMSTMP, DATE, TRANSFORM_WORKERS, TRANSFORM_PARALLEL_MIN_ROWS
+
+# Rows without a date go into one last shard, after every real day. Their customers are
+# loaded, their sales rows are dropped by sales_rows (sales are keyed on tmstmp)
+NO_DAY = pd.Timestamp.max.normalize()
+
+# Kept between batches, so a backfill pays the worker start-up once
+_pool = None
+_pool_workers = 0
+
+# A fresh forkserver (or spawn) child does not inherit the fetch threads or DB connections
+# of the ETL process the way a plain fork would
+def _context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_context())
+        _pool_workers = workers
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+atexit.register(shutdown_pool)
+
+def use_pool(online_df, offline_df, workers=TRANSFORM_WORKERS):
+    return workers > 1 and len(online_df) + len(offline_df) >= TRANSFORM_PARALLEL_MIN_ROWS
+
+# Online and offline rows numbered in one sequence (online first), the positions they have in
+# the concat of the single-process transforms. Workers keep these labels
+def number_rows(online_df, offline_df):
+    online_df = online_df.set_axis(pd.RangeIndex(len(online_df)))
+    offline_df = offline_df.set_axis(pd.RangeIndex(len(online_df), len(online_df) + len(offline_df)))
+    return online_df, offline_df
+
+def _split_days(df, column):
+    days = df[column].dt.normalize().fillna(NO_DAY)
+    return {day: frame for day, frame in df.groupby(days, sort=False)}
+
+# Runs fn(online_day, offline_day, *args) for every calendar day of the two feeds on the process
+# pool and returns the results in day order. Rows keep their order within a day
+def map_days(fn, online_df, offline_df, *args, workers=TRANSFORM_WORKERS):
+    online_days = _split_days(online_df, TMSTMP)
+    offline_days = _split_days(offline_df, DATE)
+    days = sorted(set(online_days) | set(offline_days))
+
+    online_parts = [online_days.get(day, online_df.iloc[:0]) for day in days]
+    offline_parts = [offline_days.get(day, offline_df.iloc[:0]) for day in days]
+    print(f"Transforming {len(days)} days on {workers} processes ({fn.__name__})")
+    return list(get_pool(workers).map(fn, online_parts, offline_parts, *[repeat(arg) for arg in args]))
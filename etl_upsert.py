@@ -1,14 +1,27 @@
 import time
-from config import TIME_TO_SLEEP_ETL
+from config import TIME_TO_SLEEP_ETL, ETL_POLL_MIN_SECONDS
+from db.pool import close_pool
+from orchestrator import wait_for_services
 from scripts.etl_upsert_customers_sales import etl_upsert_customer_sales
 
-while True:
-    print(f"\n🔁 Running ETL: etl_upsert_customer_sales\n{'-'*50}")
-    try:
-        etl_upsert_customer_sales()  # ✅ Call function directly
-        print(f"\n✅ Finished etl_upsert_customer_sales\n{'='*50}")
-    except Exception as e:
-        print(f"\n❌ Script failed with error: {e}\n")
+wait_for_services()
 
-    print(f"🕒 Sleeping for {TIME_TO_SLEEP_ETL} seconds...\n")
-    time.sleep(TIME_TO_SLEEP_ETL)
+# One pool for the whole loop: connections are borrowed per cycle, not reopened every cycle.
+# Adaptive polling: right after a cycle that loaded data the next one comes quickly (more
+# days are likely on the way), every idle or failed cycle doubles the wait up to TIME_TO_SLEEP_ETL
+sleep_seconds = ETL_POLL_MIN_SECONDS
+try:
+    while True:
+        print(f"\n🔁 Running ETL: etl_upsert_customer_sales\n{'-'*50}")
+        rows = 0
+        try:
+            rows = etl_upsert_customer_sales()  # ✅ Call function directly
+            print(f"\n✅ Finished etl_upsert_customer_sales\n{'='*50}")
+        except Exception as e:
+            print(f"\n❌ Script failed with error: {e}\n")
+
+        sleep_seconds = ETL_POLL_MIN_SECONDS if rows else min(sleep_seconds * 2, TIME_TO_SLEEP_ETL)
+        print(f"🕒 Sleeping for {sleep_seconds} seconds...\n")
+        time.sleep(sleep_seconds)
+finally:
+    close_pool()
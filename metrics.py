@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+import uuid
+import cProfile
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from config import METRICS_DIR, PROFILE_STAGES, PROFILE_DIR
+
+# Per-stage metrics of the pipeline: wall time, rows in/out, bytes read from S3, database
+# round trips and peak RSS. Stages of one cycle are collected in the current run and
+# flush() writes them to etl_meta.stage_runs and to a Prometheus textfile (METRICS_DIR/<job>.prom).
+# PROFILE_STAGES (comma separated stage names, or "all") turns on cProfile + tracemalloc per stage
+
+_counters = {"s3_bytes": 0, "db_round_trips": 0}
+_counters_lock = threading.Lock()
+
+# Called by the S3 readers and the counting cursor; process wide, so worker threads count too
+def add_s3_bytes(size):
+    with _counters_lock:
+        _counters["s3_bytes"] += size
+
+def add_db_round_trip():
+    with _counters_lock:
+        _counters["db_round_trips"] += 1
+
+def _snapshot():
+    with _counters_lock:
+        return dict(_counters)
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # no procfs (macOS): fall back to the process high-water mark
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+# Samples RSS in a background thread, since ru_maxrss cannot be reset between stages
+class PeakRSS:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+# What one stage did; rows_out is set by the caller inside the `with stage(...)` block
+class StageMetrics:
+    def __init__(self, name, rows_in=0):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = 0
+        self.started_at = datetime.now()
+        self.seconds = 0.0
+        self.s3_bytes = 0
+        self.db_round_trips = 0
+        self.peak_rss_mb = 0.0
+
+
+def _profiled(name):
+    return "all" in PROFILE_STAGES or name in PROFILE_STAGES
+
+
+class Run:
+    def __init__(self, job):
+        self.job = job
+        self.run_id = uuid.uuid4().hex
+        self.stages = []
+        self._lock = threading.Lock()
+
+    def add(self, metrics):
+        with self._lock:
+            self.stages.append(metrics)
+
+
+_run = None
+_totals = {}  # (job, stage) -> cumulative counters for the Prometheus export
+
+def start_run(job):
+    global _run
+    _run = Run(job)
+    return _run
+
+def current_run():
+    return _run if _run is not None else start_run(os.path.basename(sys.argv[0]).rsplit(".", 1)[0] or "pipeline")
+
+
+@contextmanager
+def stage(name, rows_in=0):
+    metrics = StageMetrics(name, rows_in)
+    before = _snapshot()
+    profiler = cProfile.Profile() if _profiled(name) else None
+    if profiler:
+        tracemalloc.start()
+        profiler.enable()
+
+    start = time.perf_counter()
+    try:
+        with PeakRSS(interval=0.05) as rss:
+            yield metrics
+    finally:
+        metrics.seconds = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+            _dump_profile(name, profiler)
+        after = _snapshot()
+        metrics.s3_bytes = after["s3_bytes"] - before["s3_bytes"]
+        metrics.db_round_trips = after["db_round_trips"] - before["db_round_trips"]
+        metrics.peak_rss_mb = rss.peak_mb
+        current_run().add(metrics)
+        print(f"⏱️ {name}: {metrics.seconds:.2f} s, rows {metrics.rows_in} -> {metrics.rows_out}, "
+              f"S3 {metrics.s3_bytes / 2**20:.1f} MB, {metrics.db_round_trips} DB round trips, "
+              f"peak RSS {metrics.peak_rss_mb:.0f} MB")
+
+def _dump_profile(name, profiler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{current_run().run_id}_{name}.prof")
+    profiler.dump_stats(path)
+
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"🔬 {name}: profile saved to {path}, traced Python allocations peaked at {peak / 2**20:.1f} MB")
+    for stat in snapshot.statistics("lineno")[:5]:
+        print(f"     {stat}")
+
+
+def write_run_log(run):
+    from psycopg2.extras import execute_values
+    from db.pool import pooled_connection  # imported here, db.pool imports this module
+
+    with pooled_connection() as conn, conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO etl_meta.stage_runs (run_id, job, stage, started_at, seconds, rows_in,
+                                             rows_out, s3_bytes, db_round_trips, peak_rss_mb)
+            VALUES %s
+        """, [
+            (run.run_id, run.job, m.name, m.started_at, m.seconds, m.rows_in, m.rows_out,
+             m.s3_bytes, m.db_round_trips, m.peak_rss_mb)
+            for m in run.stages
+        ])
+
+def _update_totals(run):
+    for m in run.stages:
+        totals = _totals.setdefault((run.job, m.name), {
+            "runs": 0, "seconds": 0.0, "rows_in": 0, "rows_out": 0, "s3_bytes": 0, "db_round_trips": 0,
+        })
+        totals["runs"] += 1
+        totals["seconds"] += m.seconds
+        totals["rows_in"] += m.rows_in
+        totals["rows_out"] += m.rows_out
+        totals["s3_bytes"] += m.s3_bytes
+        totals["db_round_trips"] += m.db_round_trips
+        totals["last_seconds"] = m.seconds
+        totals["last_peak_rss_mb"] = m.peak_rss_mb
+
+# Node exporter textfile format; written to a temp file and renamed, so a scrape never sees half a file
+def write_prometheus(job):
+    series = [
+        ("etl_stage_runs_total", "counter", "Completed runs of the stage", "runs"),
+        ("etl_stage_seconds_total", "counter", "Wall time spent in the stage", "seconds"),
+        ("etl_stage_rows_in_total", "counter", "Rows handed to the stage", "rows_in"),
+        ("etl_stage_rows_out_total", "counter", "Rows produced or written by the stage", "rows_out"),
+        ("etl_stage_s3_bytes_total", "counter", "Bytes read from S3 by the stage", "s3_bytes"),
+        ("etl_stage_db_round_trips_total", "counter", "Database round trips of the stage", "db_round_trips"),
+        ("etl_stage_last_seconds", "gauge", "Wall time of the latest run of the stage", "last_seconds"),
+        ("etl_stage_last_peak_rss_mb", "gauge", "Peak RSS during the latest run of the stage", "last_peak_rss_mb"),
+    ]
+    lines = []
+    for metric, kind, help_text, key in series:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        for (total_job, name), totals in sorted(_totals.items()):
+            if total_job == job:
+                lines.append(f'{metric}{{job="{job}",stage="{name}"}} {totals[key]}')
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{job}.prom")
+    with open(f"{path}.tmp", "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(f"{path}.tmp", path)
+
+# Exports the stages collected since the last flush and starts a new run. Exporting never
+# fails the pipeline: a missing run-log table or an unwritable directory is only reported
+def flush(to_db=True):
+    run = current_run()
+    start_run(run.job)
+    if not run.stages:
+        return
+
+    _update_totals(run)
+    try:
+        write_prometheus(run.job)
+    except OSError as e:
+        print(f"⚠️ Could not write the Prometheus textfile: {e}")
+    if to_db:
+        try:
+            write_run_log(run)
+        except Exception as e:
+            print(f"⚠️ Could not write the run log: {e}")
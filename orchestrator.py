@@ -0,0 +1,80 @@
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import psycopg2
+from db.connection import connection_params
+from config import MINIO_ENDPOINT, READINESS_TIMEOUT, READINESS_MAX_INTERVAL
+
+# Calls probe until it stops raising: fast at first (0.1 s), then doubling up to
+# READINESS_MAX_INTERVAL. Gives up with TimeoutError after `timeout` seconds
+def wait_until_ready(name, probe, timeout=READINESS_TIMEOUT):
+    start = time.monotonic()
+    interval = 0.1
+    while True:
+        try:
+            probe()
+            print(f"✅ {name} is ready after {time.monotonic() - start:.1f} s")
+            return
+        except Exception as e:
+            if time.monotonic() - start + interval > timeout:
+                raise TimeoutError(f"{name} is not ready after {timeout} s: {e}") from e
+        time.sleep(interval)
+        interval = min(interval * 2, READINESS_MAX_INTERVAL)
+
+# A real TCP login; during the container's first-boot initdb the server only listens on its socket
+def probe_postgres():
+    psycopg2.connect(connect_timeout=2, **connection_params()).close()
+
+# MinIO's liveness endpoint answers 200 once the S3 API is up
+def probe_minio():
+    with urllib.request.urlopen(f"{MINIO_ENDPOINT}/minio/health/live", timeout=2):
+        pass
+
+def wait_for_services():
+    wait_until_ready("Postgres", probe_postgres)
+    wait_until_ready("MinIO", probe_minio)
+
+# Runs a DAG of stages, {name: (func, [dependencies])}, on a thread pool: a stage starts as
+# soon as all its dependencies finished, independent stages run side by side, and the
+# dependents of a failed stage are skipped. Returns (finished, failed) stage names
+def run_stages(stages):
+    pending = dict(stages)
+    running = {}
+    finished, failed = set(), set()
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+        while pending or running:
+            changed = True
+            while changed:
+                changed = False
+                for name, (func, deps) in list(pending.items()):
+                    if any(dep in failed for dep in deps):
+                        print(f"\n⏭️ Skipping {name}, a dependency failed")
+                        failed.add(name)
+                    elif all(dep in finished for dep in deps):
+                        print(f"\nRunning {name}...\n{'-'*50}")
+                        running[pool.submit(func)] = name
+                    else:
+                        continue
+                    del pending[name]
+                    changed = True
+
+            if not running:
+                # only stages with unknown or circular dependencies are left
+                print(f"\n❌ Cannot schedule: {', '.join(pending)}")
+                failed.update(pending)
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    finished.add(name)
+                    print(f"\n✅ Finished {name} at +{time.monotonic() - start:.1f} s\n{'='*50}")
+                except Exception as e:
+                    failed.add(name)
+                    print(f"\nScript {name} failed with error:\n{e}")
+
+    return finished, failed
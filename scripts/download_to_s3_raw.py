@@ -1,7 +1,6 @@
 import os
 import sys
 import shutil
-import pandas as pd
 
 # Tells the Kaggle API where to find Kaggle credentials (kaggle.json).
 os.environ['KAGGLE_CONFIG_DIR'] = os.path.join(os.path.dirname(__file__), '../.kaggle')
@@ -9,7 +8,8 @@ os.environ['KAGGLE_CONFIG_DIR'] = os.path.join(os.path.dirname(__file__), '../.k
 from kaggle.api.kaggle_api_extended import KaggleApi
 from botocore.exceptions import ClientError
 from config import ONLINE_FILE_NAME, OFFLINE_FILE_NAME, RAW_DATA_FOLDER,\
-                    DOWNLOAD_TEMP, S3, DATASET, TMSTMP, DATE, MINIO_RAW
+                    DOWNLOAD_TEMP, S3, DATASET, TMSTMP, DATE, MINIO_RAW, RAW_FILE_SCHEMAS
+from storage.formats import read_typed_csv
 
 def bucket_exists(bucket):
     try:
@@ -76,8 +76,8 @@ def download_and_prepare_kaggle_files():
 
         print(f"Opening {file} and sorting by '{sort_column}'...")
 
-        df = pd.read_csv(temp_path)
-        df[sort_column] = pd.to_datetime(df[sort_column], errors="coerce")
+        # typed read: categorical text, nullable ints and the parsed sort column
+        df = read_typed_csv(temp_path, RAW_FILE_SCHEMAS[file])
         df = df.sort_values(by=sort_column)
         df.to_csv(raw_path, index=False)
 
@@ -1,27 +1,73 @@
 import pandas as pd
+from itertools import groupby
+from datetime import datetime, timedelta
 from botocore.exceptions import ClientError
-from db.connection import get_connection
-from etl.etl_customers import transform_customers, upsert_customers
-from etl.etl_sales import transform_sales, upsert_sales
+from db.pool import pooled_connection
+from db.file_ledger import ensure_ledger, ledger_is_empty, ledger_watermark, record_objects,\
+                           pending_files, loaded_files, mark_files
+from etl.etl_customers import transform_customers, upsert_customers, replicate_customers
+from etl.etl_sales import transform_sales, upsert_sales, replicate_sales
+from etl.customer_cache import CUSTOMER_CACHE
+from storage.formats import day_file_kind, concat_frames
+from storage.fetch import fetch_day_files
+from metrics import stage, start_run, flush
 
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="pandas.io.sql")
 
-from config import S3, MINIO_PROCESSED, MINIO_UNPROCESSED
+from config import S3, MINIO_PROCESSED, MINIO_UNPROCESSED, DATE_FORMAT,\
+                   LEDGER_LOOKBACK_DAYS, LEDGER_RECONCILE_EVERY, ETL_BATCH_MAX_FILES, ETL_BATCH_MAX_ROWS
 
-def list_all_keys(bucket_name):
-    keys = set()
+# Counts ETL cycles of this process, every LEDGER_RECONCILE_EVERY-th one re-lists everything
+_cycle = 0
+
+# Lists day files as (key, etag, size), paginated; with start_after only keys after it
+def list_day_files(bucket_name, start_after=""):
+    objects = []
     paginator = S3.get_paginator('list_objects_v2')
     try:
-        for page in paginator.paginate(Bucket=bucket_name):
+        for page in paginator.paginate(Bucket=bucket_name, StartAfter=start_after):
             for obj in page.get('Contents', []):
-                keys.add(obj['Key'])
+                if day_file_kind(obj['Key']):
+                    objects.append((obj['Key'], obj['ETag'], obj['Size']))
     except ClientError as e:
         if e.response['Error']['Code'] == 'NoSuchBucket':
             print(f"Bucket '{bucket_name}' does not exist.")
         else:
             raise
-    return keys
+    return objects
+
+# Incremental listing starts LEDGER_LOOKBACK_DAYS before the newest day in the ledger;
+# "YYYY/MM/DD" sorts right before all of that day's keys
+def lookback_start_after(watermark):
+    day = datetime.strptime("/".join(watermark.split("/")[:3]), DATE_FORMAT)
+    return (day - timedelta(days=LEDGER_LOOKBACK_DAYS)).strftime(DATE_FORMAT)
+
+# Finds files to process through the ledger: an incremental listing from the watermark
+# (a full one on the first cycle and every LEDGER_RECONCILE_EVERY cycles), recorded in the
+# ledger, then every ledger entry that is not processed yet
+def discover_new_files(conn):
+    global _cycle
+    ensure_ledger(conn)
+
+    if ledger_is_empty(conn):
+        # first run with a ledger: whatever already reached processed-data counts as done
+        print("File ledger is empty, seeding it from processed-data...")
+        record_objects(conn, list_day_files(MINIO_PROCESSED), status="processed")
+
+    watermark = ledger_watermark(conn)
+    full_listing = watermark is None or _cycle % LEDGER_RECONCILE_EVERY == 0
+    _cycle += 1
+
+    start_after = "" if full_listing else lookback_start_after(watermark)
+    print(f"Listing files in unprocessed-data {'(full)' if full_listing else f'after {start_after}'}...")
+    changed = record_objects(conn, list_day_files(MINIO_UNPROCESSED, start_after))
+    if changed:
+        print(f"Recorded {changed} new or changed files in the ledger")
+
+    new_files = pending_files(conn)
+    conn.commit()
+    return new_files
 
 def ensure_processed_bucket_exists():
     try:
@@ -31,60 +77,157 @@ def ensure_processed_bucket_exists():
         S3.create_bucket(Bucket=MINIO_PROCESSED)
 
 def download_and_concat(file_list):
-    dfs = []
-    for key in file_list:
-        obj = S3.get_object(Bucket=MINIO_UNPROCESSED, Key=key)
-        df = pd.read_csv(obj["Body"])
-        dfs.append(df)
-    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+    # CSV or Parquet, detected per object; fetched concurrently, concatenated in date order
+    dfs = fetch_day_files(MINIO_UNPROCESSED, file_list)
+    return concat_frames(dfs)
+
+# Day folder of a key, 2023/01/05/online.csv -> 2023/01/05
+def _day(key):
+    return key.rsplit("/", 1)[0]
+
+# Cuts the pending files into download batches of whole days, in date order,
+# with at most ETL_BATCH_MAX_FILES files each
+def plan_batches(files, max_files=ETL_BATCH_MAX_FILES):
+    batches, batch = [], []
+    for day, day_files in groupby(sorted(files), key=_day):
+        day_files = list(day_files)
+        if batch and len(batch) + len(day_files) > max_files:
+            batches.append(batch)
+            batch = []
+        batch += day_files
+    if batch:
+        batches.append(batch)
+    return batches
+
+# Splits a downloaded batch into loads of whole days with at most ETL_BATCH_MAX_ROWS rows.
+# Returns lists of (key, frame)
+def split_by_rows(keys, frames, max_rows=ETL_BATCH_MAX_ROWS):
+    chunks, chunk, rows = [], [], 0
+    for day, day_frames in groupby(zip(keys, frames), key=lambda item: _day(item[0])):
+        day_frames = list(day_frames)
+        day_rows = sum(len(df) for _, df in day_frames)
+        if chunk and rows + day_rows > max_rows:
+            chunks.append(chunk)
+            chunk, rows = [], 0
+        chunk += day_frames
+        rows += day_rows
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+# Transforms and upserts one batch without committing. The batch is sent to prod only; playground
+# gets the same rows server-side from prod's staging tables, in the same transaction.
+# Returns the customer ids the prod upsert returned, for the customer cache once the batch is committed
+def load_files(online_df, offline_df, conn):
+    rows_in = len(online_df) + len(offline_df)
+    with stage("transform_customers", rows_in) as m:
+        # only new and changed customers go to the database
+        customers_df = transform_customers(online_df, offline_df, delta_cache=CUSTOMER_CACHE)
+        m.rows_out = len(customers_df)
+
+    with stage("upsert_customers.prod", len(customers_df)) as m:
+        customer_ids = upsert_customers(customers_df, conn, "prod", commit=False)
+        m.rows_out = len(customer_ids)
+    with stage("upsert_customers.playground", len(customers_df)) as m:
+        result = replicate_customers(customers_df, conn, "playground", commit=False)
+        m.rows_out = result.inserted + result.updated if result else 0
+
+    # customer ids come from the prod upsert and the customer cache, not from a full customers table read
+    emails = pd.concat([online_df["customer_email"], offline_df["customer_email"]]).dropna().unique()
+    known_ids = pd.concat([customer_ids, CUSTOMER_CACHE.known_ids(emails)], ignore_index=True)
+    with stage("transform_sales", rows_in) as m:
+        sales_df = transform_sales(online_df, offline_df, conn, schema='prod', customer_ids=known_ids)
+        m.rows_out = len(sales_df)
+    with stage("upsert_sales.prod", len(sales_df)) as m:
+        result = upsert_sales(sales_df, conn, "prod", commit=False)
+        m.rows_out = result.inserted + result.updated if result else 0
+    with stage("upsert_sales.playground", len(sales_df)) as m:
+        result = replicate_sales(sales_df, conn, "playground", commit=False)
+        m.rows_out = result.inserted + result.updated if result else 0
+    return customer_ids
+
+# Copies loaded files to the processed bucket, then marks them processed
+def promote_files(conn, keys):
+    with stage("promote", len(keys)) as m:
+        for key in keys:
+            copy_source = {"Bucket": MINIO_UNPROCESSED, "Key": key}
+            S3.copy(copy_source, MINIO_PROCESSED, key)
+            #s3.delete_object(Bucket=MINIO_UNPROCESSED, Key=key) turned off for a while
+            print(f"Moved {key} to '{MINIO_PROCESSED}'")
+        mark_files(conn, keys, "processed")
+        conn.commit()
+        m.rows_out = len(keys)
+
+# One micro-batch: all upserts and the ledger update commit in one transaction, so after a
+# crash the ETL resumes from the last committed batch. Returns the number of rows loaded
+def load_chunk(chunk):
+    keys = [key for key, _ in chunk]
+    online_df = concat_frames(df for key, df in chunk if day_file_kind(key) == "online")
+    offline_df = concat_frames(df for key, df in chunk if day_file_kind(key) == "offline")
+    online_df = online_df.sort_values(by="tmstmp")
+    offline_df = offline_df.sort_values(by="date")
+
+    with pooled_connection() as conn:
+        try:
+            customer_ids = load_files(online_df, offline_df, conn)
+            mark_files(conn, keys, "loaded")
+            conn.commit()
+        except Exception:
+            # the files stay in the ledger and are picked up again next cycle
+            CUSTOMER_CACHE.discard()
+            conn.rollback()
+            mark_files(conn, keys, "failed")
+            conn.commit()
+            raise
+        CUSTOMER_CACHE.commit(customer_ids)
+        promote_files(conn, keys)
 
-def etl_upsert_customer_sales():
-    ensure_processed_bucket_exists()
+    return len(online_df) + len(offline_df)
 
-    print("Listing files in unprocessed-data...")
-    unprocessed_files = list_all_keys(MINIO_UNPROCESSED)
+# One cycle; its stage metrics are exported when it ends, also when it fails
+def etl_upsert_customer_sales():
+    start_run("etl_upsert_customers_sales")
+    try:
+        return _etl_upsert_customer_sales()
+    finally:
+        flush()
 
-    print("Listing files in processed-data...")
-    processed_files = list_all_keys(MINIO_PROCESSED)
+def _etl_upsert_customer_sales():
+    ensure_processed_bucket_exists()
 
-    new_files = unprocessed_files - processed_files
+    with pooled_connection() as conn:
+        ensure_ledger(conn)
+        # playground only gets the customers the delta sends, so it is checked too
+        CUSTOMER_CACHE.sync(conn, replicas=["playground"])
+        # a batch that committed but was not copied to processed-data before a crash
+        interrupted = loaded_files(conn)
+        if interrupted:
+            print(f"Promoting {len(interrupted)} files loaded by an interrupted run...")
+            promote_files(conn, interrupted)
+        with stage("list") as m:
+            new_files = discover_new_files(conn)
+            m.rows_out = len(new_files)
 
     if not new_files:
         print("No new files to process.")
-        return
+        return 0
 
     print("New files to process:")
     for file in sorted(new_files):
         print(f"  • {file}")
 
-    online_files = [f for f in new_files if f.endswith("online.csv")]
-    offline_files = [f for f in new_files if f.endswith("offline.csv")]
-
-    if not online_files and not offline_files:
-        print("No online or offline files found in the new files.")
-        return
-
-    # collect new data for online and offline sales
-    online_df = download_and_concat(online_files).sort_values(by="tmstmp")
-    offline_df = download_and_concat(offline_files).sort_values(by="date")
-
-    # process new data for customers, upsert --> for sales
-    
-    with get_connection() as conn:
-        customers_df = transform_customers(online_df, offline_df)
-        for schema in ["prod", "playground"]:
-            upsert_customers(customers_df, conn, schema)
-
-        sales_df = transform_sales(online_df, offline_df, conn, schema='prod')
-        for schema in ["prod", "playground"]:
-            upsert_sales(sales_df, conn, schema)
-
-
-    # Move processed files to processed-data bucket
-    for key in sorted(new_files):
-        copy_source = {"Bucket": MINIO_UNPROCESSED, "Key": key}
-        S3.copy(copy_source, MINIO_PROCESSED, key)
-        #s3.delete_object(Bucket=MINIO_UNPROCESSED, Key=key) turned off for a while
-        print(f"Moved {key} to '{MINIO_PROCESSED}'")
-
-    print("All done. Kol Hakavod")
\ No newline at end of file
+    # batches keep memory bounded however long the backlog is; each one commits on its own
+    batches = plan_batches(new_files)
+    total_rows = 0
+    for number, batch in enumerate(batches, 1):
+        print(f"Batch {number}/{len(batches)}: {_day(batch[0])} .. {_day(batch[-1])} ({len(batch)} files)")
+        with stage("fetch", len(batch)) as m:
+            frames = fetch_day_files(MINIO_UNPROCESSED, batch)
+            m.rows_out = sum(len(df) for df in frames)
+        for chunk in split_by_rows(batch, frames):
+            total_rows += load_chunk(chunk)
+        del frames
+
+    print(f"Loaded {total_rows} rows from {len(new_files)} files.")
+    print("All done. Kol Hakavod")
+    return total_rows
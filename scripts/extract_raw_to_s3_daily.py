@@ -1,60 +1,34 @@
 import time
-import pandas as pd
-from datetime import timedelta
-from io import StringIO
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from botocore.exceptions import ClientError
 from config import ONLINE_FILE_NAME, OFFLINE_FILE_NAME, S3, TIME_TO_SLEEP,\
-                     TMSTMP, DATE, DATE_FORMAT, MINIO_UNPROCESSED, MINIO_RAW
-
-# Scans all objects in unprocessed-data, parses year/month/day from object keys, returns
-# a sorted list of all days that have already been processed
-def list_existing_dates():
-    result = S3.list_objects_v2(Bucket=MINIO_UNPROCESSED)
-    existing_dates = set()
-
-    for obj in result.get("Contents", []):
-        key = obj["Key"]
-        parts = key.split("/")
-        if len(parts) >= 3:
-            year, month, day = parts[:3]
-            existing_dates.add(f"{year}/{month}/{day}")
-
-    return sorted(existing_dates)
-
-# starts from earliest date in raw data, skips all already in unprocessed-data, returns next date
-def get_next_date(start, processed_dates):
-    date = start
-    while date.strftime(DATE_FORMAT) in processed_dates:
-        date += timedelta(days=1)
-    return date
-
-# reads csv from s3, parses date column, sorts by date, returns clean df
-def read_csv_from_s3(bucket, key, date_column):
-    obj = S3.get_object(Bucket=bucket, Key=key)
-    df = pd.read_csv(obj['Body'])
-    df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
-    df = df.sort_values(by=date_column)
-    return df
-
-# converts df to csv in memory, uploads to s3 under the path, confirms with a print
-def write_csv_to_s3(df, bucket, key):
-    csv_buffer = StringIO()
-    df.to_csv(csv_buffer, index=False)
-    S3.put_object(Bucket=bucket, Key=key, Body=csv_buffer.getvalue())
-    print(f"Saved {key}")
-
-# filters both dfs (online, offline) to get only records from the given date, 
-# creates a filder-like prefix YYYY/MM/DD/, uploads one online.csv and one offline.csv
-def process_one_day(raw_online, raw_offline, current_date):
-    # Filter data for the current date
-    online_day = raw_online[raw_online[TMSTMP].dt.date == current_date.date()]
-    offline_day = raw_offline[raw_offline[DATE].dt.date == current_date.date()]
+                     TMSTMP, DATE, DATE_FORMAT, MINIO_UNPROCESSED, MINIO_RAW,\
+                     BACKFILL_UNTIL, BACKFILL_CONCURRENCY, ONLINE_SCHEMA, OFFLINE_SCHEMA
+from storage.formats import write_day_file
+from storage.day_index import load_day_index, read_day, first_day, last_day
+from storage.checkpoint import load_checkpoint, save_checkpoint, reconcile_checkpoint,\
+                               watermark_exists, next_date as get_next_date, mark_done,\
+                               pending_dates
+from metrics import stage, start_run, flush
+
+# Backfill saves the checkpoint after this many finished days (and once at the end)
+CHECKPOINT_EVERY_DAYS = 25
+
+# fetches only the given date's rows of both raw files (online, offline) with ranged GETs,
+# creates a filder-like prefix YYYY/MM/DD/, uploads one online and one offline file
+# in the configured OBJECT_FORMAT (csv or parquet)
+def process_one_day(online_index, offline_index, current_date):
+    online_day = read_day(MINIO_RAW, online_index, current_date, ONLINE_SCHEMA)
+    offline_day = read_day(MINIO_RAW, offline_index, current_date, OFFLINE_SCHEMA)
 
     year, month, day = current_date.strftime(DATE_FORMAT).split("/")
     prefix = f"{year}/{month}/{day}/"
 
-    write_csv_to_s3(online_day, MINIO_UNPROCESSED, f"{prefix}online.csv")
-    write_csv_to_s3(offline_day, MINIO_UNPROCESSED, f"{prefix}offline.csv")
+    write_day_file(online_day, MINIO_UNPROCESSED, prefix, "online")
+    write_day_file(offline_day, MINIO_UNPROCESSED, prefix, "offline")
+    return len(online_day) + len(offline_day)
 
 def ensure_bucket_exists(bucket):
     """Ensures a bucket exists in S3, creates it if not."""
@@ -64,33 +38,111 @@ def ensure_bucket_exists(bucket):
         print(f"Creating bucket '{bucket}'...")
         S3.create_bucket(Bucket=bucket)
 
-# loads full df into memory once, finds earliest date from both sources,
-# in a loop: gets processed dates from s3, finds next date to process, saves per day CSVs
-# to unprocessed-data bucket, sleeps for selected time
-def extract_raw_to_s3_daily():
+# Loads the extraction checkpoint; rebuilds it with a full paginated listing only when it is
+# missing or its watermark day is no longer in the unprocessed bucket
+def get_checkpoint(min_date):
+    checkpoint = load_checkpoint()
+    if checkpoint is not None and watermark_exists(checkpoint):
+        return checkpoint
+
+    print("No usable extraction checkpoint, reconciling with the unprocessed bucket...")
+    checkpoint = reconcile_checkpoint(min_date)
+    save_checkpoint(checkpoint)
+    return checkpoint
+
+# Extracts every pending day in [start_date, end_date] at once, `concurrency` days in flight.
+# The checkpoint is only touched from this thread; a failed day is left behind as a gap
+def backfill(online_index, offline_index, checkpoint, min_date, end_date,
+             concurrency=BACKFILL_CONCURRENCY, start_date=None):
+    dates = [date for date in pending_dates(checkpoint, min_date, end_date)
+             if start_date is None or date >= start_date]
+    if not dates:
+        print("Nothing to backfill.")
+        return checkpoint
+
+    print(f"Backfilling {len(dates)} days up to {end_date.strftime(DATE_FORMAT)} with {concurrency} threads...")
+    start = time.perf_counter()
+    done_days, rows, failed = 0, 0, []
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(process_one_day, online_index, offline_index, date): date for date in dates}
+        for future in as_completed(futures):
+            date = futures[future]
+            try:
+                rows += future.result()
+            except Exception as e:
+                failed.append(date.strftime(DATE_FORMAT))
+                print(f"❌ Failed to extract {date.strftime(DATE_FORMAT)}: {e}")
+                continue
+            mark_done(checkpoint, date)
+            done_days += 1
+            if done_days % CHECKPOINT_EVERY_DAYS == 0:
+                save_checkpoint(checkpoint)
+
+    save_checkpoint(checkpoint)
+    seconds = time.perf_counter() - start
+    print(f"Backfilled {done_days} days ({rows} rows) in {seconds:.1f}s: "
+          f"{done_days / seconds:.1f} days/s, {rows / seconds:.0f} rows/s"
+          + (f", failed: {', '.join(sorted(failed))}" if failed else ""))
+    return checkpoint
+
+# "latest" means the last day found in either raw file, otherwise a YYYY/MM/DD date
+def parse_backfill_until(value, online_index, offline_index):
+    if value == "latest":
+        return max(day for day in (last_day(online_index), last_day(offline_index)) if day is not None)
+    return datetime.strptime(value, DATE_FORMAT)
+
+# loads (or builds once) the byte-offset day index of both raw files, finds earliest date
+# from both sources, in a loop: reads the next date from the checkpoint, saves per day files
+# to unprocessed-data bucket, moves the checkpoint, sleeps for selected time
+def extract_raw_to_s3_daily(backfill_until=BACKFILL_UNTIL, concurrency=BACKFILL_CONCURRENCY,
+                            backfill_from=None):
     """
-    Loads full raw data into memory, then loops:
-    - checks which days were processed
+    Keeps only the day indexes of the raw files in memory, so memory use does not grow
+    with the raw file size. With backfill_until ("latest" or YYYY/MM/DD) it first catches up
+    on all pending days (from backfill_from, if given) in parallel, then loops:
+    - takes the next day from the checkpoint (oldest gap, else the day after the watermark)
     - processes one more day
-    - uploads online/offline CSVs for that day
+    - uploads online/offline files for that day
     - waits TIME_TO_SLEEP seconds
     """
+    start_run("extract_raw_to_s3_daily")
     ensure_bucket_exists(MINIO_UNPROCESSED)
 
-    raw_online = read_csv_from_s3(MINIO_RAW, ONLINE_FILE_NAME, TMSTMP)
-    raw_offline = read_csv_from_s3(MINIO_RAW, OFFLINE_FILE_NAME, DATE)
+    online_index = load_day_index(MINIO_RAW, ONLINE_FILE_NAME, TMSTMP)
+    offline_index = load_day_index(MINIO_RAW, OFFLINE_FILE_NAME, DATE)
 
-    min_date = min(raw_online[TMSTMP].min(), raw_offline[DATE].min())
-    min_date = min_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    min_date = min(day for day in (first_day(online_index), first_day(offline_index)) if day is not None)
 
-    while True:
-        print("Checking what has already been processed...")
-        existing = list_existing_dates()
+    checkpoint = get_checkpoint(min_date)
+
+    if backfill_until:
+        end_date = parse_backfill_until(backfill_until, online_index, offline_index)
+        start_date = datetime.strptime(backfill_from, DATE_FORMAT) if backfill_from else None
+        with stage("backfill"):
+            checkpoint = backfill(online_index, offline_index, checkpoint, min_date, end_date,
+                                  concurrency, start_date)
+        flush(to_db=False)
 
-        next_date = get_next_date(min_date, existing)
+    # back to the paced simulation: one day per tick
+    while True:
+        next_date = get_next_date(checkpoint, min_date)
         print(f'Processing day: {next_date.strftime(DATE_FORMAT)}')
 
-        process_one_day(raw_online, raw_offline, next_date)
+        with stage("extract_day") as m:
+            m.rows_out = process_one_day(online_index, offline_index, next_date)
+            save_checkpoint(mark_done(checkpoint, next_date))
+        # the extractor does not need Postgres, so its metrics only go to the textfile
+        flush(to_db=False)
 
         print(f"Sleeping for {TIME_TO_SLEEP} seconds...\n")
-        time.sleep(TIME_TO_SLEEP)
\ No newline at end of file
+        time.sleep(TIME_TO_SLEEP)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract raw sales to daily files in the unprocessed bucket")
+    parser.add_argument("--backfill-until", default=BACKFILL_UNTIL,
+                        help='catch up to "latest" or a YYYY/MM/DD date before the paced loop')
+    parser.add_argument("--backfill-from", help="first YYYY/MM/DD date of the backfill range")
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    args = parser.parse_args()
+    extract_raw_to_s3_daily(args.backfill_until, args.concurrency, args.backfill_from)
@@ -1,69 +1,93 @@
 import os
-import pandas as pd
-from datetime import datetime
-from db.connection import get_connection
-from config import SCHEMAS, SEEDS, SEEDS_MAPPING
+import csv
+import hashlib
+from db.pool import pooled_connection
+from db.bulk_upsert import create_staging_table, merge_staging
+from orchestrator import run_stages
+from config import SCHEMAS, SEEDS, SEEDS_MAPPING, SEED_DEPENDENCIES
 
-def insert_dataframe_to_table(df, table_name, schema, conn):
-    df['inserted_at'] = datetime.now()
+def file_checksum(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    placeholders = ', '.join(['%s'] * len(df.columns))
-    columns = ', '.join(df.columns)
+def seed_is_current(cur, schema, table_name, checksum):
+    cur.execute("""
+        SELECT checksum = %s FROM etl_meta.seed_checksums
+        WHERE schema_name = %s AND table_name = %s
+    """, (checksum, schema, table_name))
+    row = cur.fetchone()
+    return bool(row and row[0])
 
-    cur = conn.cursor()
-    for row in df.itertuples(index=False, name=None):
-         # Clean each value: convert NaN or invalid string to None
-        cleaned_row = tuple(None if pd.isna(val) else val for val in row) # This is what I fixed to upload None --> null in postgres 06.07.2025
-        sql = f"INSERT INTO {schema}.{table_name} ({columns}) VALUES ({placeholders})"
-        cur.execute(sql, cleaned_row)
-    conn.commit()
-    cur.close()
-    print(f"Inserted {len(df)} rows into {schema}.{table_name}")
+def record_seed(cur, schema, table_name, checksum):
+    cur.execute("""
+        INSERT INTO etl_meta.seed_checksums (schema_name, table_name, checksum)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (schema_name, table_name) DO UPDATE
+        SET checksum = EXCLUDED.checksum, loaded_at = CURRENT_TIMESTAMP
+    """, (schema, table_name, checksum))
 
-def load_dim_tables():
-    conn = get_connection()
-    inserted_any = False  # Track whether anything got inserted
-    inserted_count = 0  # New counter
-
-    for file_name, table_name in SEEDS_MAPPING.items():
-        file_path = os.path.join(SEEDS, file_name)
-
-        if not os.path.exists(file_path):
-            print(f"File not found: {file_path}")
-            continue
+# Streams the seed CSV into a staging table with COPY and upserts it on the primary key
+# (the first seed column), so a changed seed updates rows in place. The serial sequence is
+# moved past the seeded ids afterwards. Returns (inserted, updated)
+def copy_seed(cur, file_path, table_name, schema):
+    with open(file_path, "r", newline="") as f:
+        columns = next(csv.reader(f))
+    pk = columns[0]
 
-        df = pd.read_csv(file_path)
+    staging = create_staging_table(cur, schema, table_name, columns + ["inserted_at"])
+    cur.execute(f"ALTER TABLE {staging} ALTER COLUMN inserted_at SET DEFAULT CURRENT_TIMESTAMP")
+    with open(file_path, "r", newline="") as f:
+        cur.copy_expert(
+            f"COPY {staging} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)", f
+        )
 
-        for schema in SCHEMAS:
-            with conn.cursor() as cur:
-                # 1. Check if table exists
-                cur.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = %s AND table_name = %s
-                    )
-                """, (schema, table_name))
-                table_exists = cur.fetchone()[0]
+    inserted, updated, _ = merge_staging(cur, staging, schema, table_name, columns + ["inserted_at"], [pk])
+    cur.execute(f"""
+        SELECT setval(pg_get_serial_sequence('{schema}.{table_name}', '{pk}'), MAX({pk}))
+        FROM {schema}.{table_name}
+    """)
+    return inserted, updated
 
-                if not table_exists:
-                    print(f"Table '{table_name}' does not exist in schema '{schema}'. Skipping.")
-                    continue
+# Loads one seed file into every schema, one transaction per schema. A schema whose stored
+# checksum matches the file is skipped. Returns the schemas that were loaded
+def load_seed(file_name, table_name):
+    file_path = os.path.join(SEEDS, file_name)
+    if not os.path.exists(file_path):
+        print(f"File not found: {file_path}")
+        return []
 
-                # 2. Check if table is empty
-                cur.execute(f"SELECT COUNT(*) FROM {schema}.{table_name}")
-                count = cur.fetchone()[0]
-
-            if count > 0:
-                print(f"Skipping {schema}.{table_name} — already has {count} rows.")
+    checksum = file_checksum(file_path)
+    loaded = []
+    for schema in SCHEMAS:
+        with pooled_connection() as conn, conn.cursor() as cur:
+            if seed_is_current(cur, schema, table_name, checksum):
+                print(f"Skipping {schema}.{table_name} — {file_name} is unchanged.")
                 continue
 
-            # 3. Insert data
-            insert_dataframe_to_table(df.copy(), table_name, schema, conn)
-            inserted_any = True
-            inserted_count += 1  # Increment counter
+            inserted, updated = copy_seed(cur, file_path, table_name, schema)
+            record_seed(cur, schema, table_name, checksum)
+            print(f"Loaded {file_name} into {schema}.{table_name}: {inserted} inserted, {updated} updated")
+            loaded.append(schema)
+    return loaded
+
+# Independent seeds load in parallel; products waits for its category tables (SEED_DEPENDENCIES)
+def load_dim_tables():
+    loaded = []
+    stages = {
+        table_name: (
+            lambda file_name=file_name, table_name=table_name: loaded.extend(load_seed(file_name, table_name)),
+            SEED_DEPENDENCIES.get(table_name, []),
+        )
+        for file_name, table_name in SEEDS_MAPPING.items()
+    }
+    _, failed = run_stages(stages)
+    if failed:
+        raise RuntimeError(f"Seed loading failed for: {', '.join(sorted(failed))}")
 
-    conn.close()
-    if inserted_any:
-        print(f"Data was inserted into {inserted_count} dimention tables.")
+    if loaded:
+        print(f"Data was loaded into {len(loaded)} dimention tables.")
     else:
-        print("No data was inserted — all tables either missing or not empty.")
\ No newline at end of file
+        print("No data was loaded — all seeds are unchanged.")
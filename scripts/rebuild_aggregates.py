@@ -0,0 +1,23 @@
+from db.pool import pooled_connection, close_pool
+from config import SCHEMAS, AGGREGATE_TABLES
+
+# Recovery path for the dashboard aggregates (db/migrations/0003): empties them and
+# re-aggregates every day in sales, one transaction per schema
+def rebuild_aggregates():
+    with pooled_connection() as conn, conn.cursor() as cur:
+        for schema in SCHEMAS:
+            cur.execute(f"TRUNCATE {', '.join(f'{schema}.{table}' for table in AGGREGATE_TABLES)}")
+            cur.execute(f"""
+                SELECT {schema}.refresh_sales_aggregates(ARRAY(
+                    SELECT DISTINCT tmstmp::date FROM {schema}.sales WHERE tmstmp IS NOT NULL
+                ))
+            """)
+            days = cur.fetchone()[0]
+            conn.commit()
+            print(f"✅ Rebuilt aggregates of '{schema}' for {days} days")
+
+if __name__ == "__main__":
+    try:
+        rebuild_aggregates()
+    finally:
+        close_pool()
@@ -1,17 +1,13 @@
-from db.connection import get_connection
+from db.pool import pooled_connection
 from config import DROP_TABLE_SCHEMAS_PATH
 
 def run_schema_sql():
     with open(DROP_TABLE_SCHEMAS_PATH, "r") as f:
         sql = f.read()
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(sql)
-    conn.commit()
+    with pooled_connection() as conn, conn.cursor() as cur:
+        cur.execute(sql)
 
-    cur.close()
-    conn.close()
     print("✅ Schemas and tables dropped successfully.")
 
 if __name__ == "__main__":
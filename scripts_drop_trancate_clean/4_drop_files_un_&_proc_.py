@@ -1,4 +1,7 @@
 import botocore
+from storage.checkpoint import delete_checkpoint
+from db.pool import pooled_connection
+from db.file_ledger import clear_ledger
 from config import S3, BUCKET_LIST
 
 def delete_all_objects(bucket):
@@ -21,4 +24,13 @@ def delete_all_objects(bucket):
 
 if __name__ == "__main__":
     for bucket in BUCKET_LIST:
-        delete_all_objects(bucket)
\ No newline at end of file
+        delete_all_objects(bucket)
+
+    # the extraction checkpoint would otherwise point past days that no longer exist
+    delete_checkpoint()
+    print("🧹 Deleted the extraction checkpoint.")
+
+    # same for the file ledger, or the ETL would skip days that get re-extracted
+    with pooled_connection() as conn:
+        clear_ledger(conn)
+    print("🧹 Cleared the file ledger.")
\ No newline at end of file
@@ -1,5 +1,8 @@
 from dotenv import load_dotenv
 from botocore.exceptions import ClientError
+from storage.checkpoint import delete_checkpoint
+from db.pool import pooled_connection
+from db.file_ledger import clear_ledger
 from config import BUCKET_LIST, S3
 
 def delete_bucket_completely(bucket):
@@ -32,4 +35,13 @@ def delete_bucket_completely(bucket):
 
 if __name__ == "__main__":
     for bucket in BUCKET_LIST:
-        delete_bucket_completely(bucket)
\ No newline at end of file
+        delete_bucket_completely(bucket)
+
+    # the extraction checkpoint would otherwise point past days that no longer exist
+    delete_checkpoint()
+    print("🧹 Deleted the extraction checkpoint.")
+
+    # same for the file ledger, or the ETL would skip days that get re-extracted
+    with pooled_connection() as conn:
+        clear_ledger(conn)
+    print("🧹 Cleared the file ledger.")
\ No newline at end of file
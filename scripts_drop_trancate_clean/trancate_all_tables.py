@@ -1,6 +1,6 @@
 import traceback
 import psycopg2
-from db.connection import get_connection
+from db.pool import pooled_connection, close_pool
 from config import TRUNCATE_ALL_TABLES_PATH, SCHEMAS
 
 def run_truncate_sql():
@@ -15,32 +15,24 @@ def run_truncate_sql():
         traceback.print_exc()
         return
 
-    conn = None
-    cur = None
-
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        for schema in SCHEMAS:
-            sql = sql_template.replace("{{schema}}", schema)
-            try:
-                cur.execute(sql)
-                conn.commit()
-                print(f"✅ Truncated all tables in schema '{schema}'")
-            except Exception as e:
-                print(f"❌ Failed to truncate schema '{schema}': {e}")
-                traceback.print_exc()
-                conn.rollback()
+        with pooled_connection() as conn, conn.cursor() as cur:
+            for schema in SCHEMAS:
+                sql = sql_template.replace("{{schema}}", schema)
+                try:
+                    cur.execute(sql)
+                    conn.commit()
+                    print(f"✅ Truncated all tables in schema '{schema}'")
+                except Exception as e:
+                    print(f"❌ Failed to truncate schema '{schema}': {e}")
+                    traceback.print_exc()
+                    conn.rollback()
 
     except psycopg2.DatabaseError as e:
         print(f"❌ Database connection error: {e}")
         traceback.print_exc()
     finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+        close_pool()
         print("🔌 Connection closed.")
 
 
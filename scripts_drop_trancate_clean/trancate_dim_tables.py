@@ -1,4 +1,4 @@
-from db.connection import get_connection
+from db.pool import pooled_connection, close_pool
 from config import TRUNCATE_DIM_TABLES_PATH, SCHEMAS
 import psycopg2
 
@@ -13,30 +13,22 @@ def run_truncate_sql():
         print(f"❌ Failed to read SQL file: {e}")
         return
 
-    conn = None
-    cur = None
-
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        for schema in SCHEMAS:
-            sql = sql_template.replace("{{schema}}", schema)
-            try:
-                cur.execute(sql)
-                conn.commit()
-                print(f"✅ Truncated dim tables in schema '{schema}'")
-            except Exception as e:
-                print(f"❌ Failed to truncate schema '{schema}': {e}")
-                conn.rollback()
+        with pooled_connection() as conn, conn.cursor() as cur:
+            for schema in SCHEMAS:
+                sql = sql_template.replace("{{schema}}", schema)
+                try:
+                    cur.execute(sql)
+                    conn.commit()
+                    print(f"✅ Truncated dim tables in schema '{schema}'")
+                except Exception as e:
+                    print(f"❌ Failed to truncate schema '{schema}': {e}")
+                    conn.rollback()
 
     except psycopg2.Error as e:
         print(f"❌ Database error: {e}")
     finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+        close_pool()
         print("🔌 Connection closed.")
 
 if __name__ == "__main__":
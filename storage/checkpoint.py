@@ -0,0 +1,105 @@
+import json
+from datetime import datetime, timedelta
+from botocore.exceptions import ClientError
+from config import S3, MINIO_RAW, MINIO_UNPROCESSED, DATE_FORMAT, EXTRACT_CHECKPOINT_KEY
+
+# The extraction checkpoint is a small JSON object next to the raw files:
+#   {"watermark": "2023/03/14", "gaps": ["2023/02/02"]}
+# watermark is the latest extracted day, gaps are earlier days that are still missing.
+# The next day to extract is then known without listing the unprocessed bucket.
+
+def _to_date(value):
+    return datetime.strptime(value, DATE_FORMAT)
+
+def load_checkpoint():
+    try:
+        obj = S3.get_object(Bucket=MINIO_RAW, Key=EXTRACT_CHECKPOINT_KEY)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(obj["Body"].read())
+
+def save_checkpoint(checkpoint):
+    S3.put_object(Bucket=MINIO_RAW, Key=EXTRACT_CHECKPOINT_KEY, Body=json.dumps(checkpoint).encode("utf-8"))
+
+def delete_checkpoint():
+    S3.delete_object(Bucket=MINIO_RAW, Key=EXTRACT_CHECKPOINT_KEY)
+
+# Oldest missing day first, otherwise the day after the watermark
+def next_date(checkpoint, min_date):
+    if checkpoint["gaps"]:
+        return _to_date(min(checkpoint["gaps"]))
+    if checkpoint["watermark"]:
+        return _to_date(checkpoint["watermark"]) + timedelta(days=1)
+    return min_date
+
+# Every day up to end_date that still has to be extracted: the gaps, then the days after the watermark
+def pending_dates(checkpoint, min_date, end_date):
+    dates = [_to_date(day) for day in sorted(checkpoint["gaps"]) if _to_date(day) <= end_date]
+    day = _to_date(checkpoint["watermark"]) + timedelta(days=1) if checkpoint["watermark"] else min_date
+    while day <= end_date:
+        dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+# Records a finished day: fills a gap, or moves the watermark and remembers any skipped days as gaps
+def mark_done(checkpoint, date):
+    day = date.strftime(DATE_FORMAT)
+    if day in checkpoint["gaps"]:
+        checkpoint["gaps"].remove(day)
+    elif checkpoint["watermark"] is None or day > checkpoint["watermark"]:
+        if checkpoint["watermark"] is not None:
+            missing = _to_date(checkpoint["watermark"]) + timedelta(days=1)
+            while missing < date:
+                checkpoint["gaps"].append(missing.strftime(DATE_FORMAT))
+                missing += timedelta(days=1)
+        checkpoint["watermark"] = day
+    return checkpoint
+
+# Cheap sanity check: the watermark day must still exist in the unprocessed bucket
+# (the cleanup scripts may have emptied it since the checkpoint was written)
+def watermark_exists(checkpoint):
+    if checkpoint["watermark"] is None:
+        return True
+    result = S3.list_objects_v2(Bucket=MINIO_UNPROCESSED, Prefix=f"{checkpoint['watermark']}/", MaxKeys=1)
+    return result.get("KeyCount", 0) > 0
+
+# Paginated listing scoped to one YYYY/ prefix at a time (year prefixes come from a delimiter
+# listing), so it is complete past 1000 keys. Returns the extracted days as YYYY/MM/DD
+def list_existing_dates():
+    existing_dates = set()
+    paginator = S3.get_paginator("list_objects_v2")
+
+    years = [
+        prefix["Prefix"]
+        for page in paginator.paginate(Bucket=MINIO_UNPROCESSED, Delimiter="/")
+        for prefix in page.get("CommonPrefixes", [])
+    ]
+    for year in years:
+        for page in paginator.paginate(Bucket=MINIO_UNPROCESSED, Prefix=year):
+            for obj in page.get("Contents", []):
+                parts = obj["Key"].split("/")
+                if len(parts) >= 4 and parts[0].isdigit():
+                    existing_dates.add("/".join(parts[:3]))
+
+    return existing_dates
+
+# Full reconcile against the bucket, only needed when there is no usable checkpoint
+def reconcile_checkpoint(min_date):
+    existing = list_existing_dates()
+    checkpoint = {"watermark": None, "gaps": []}
+    if not existing:
+        return checkpoint
+
+    # every day between the first raw day and the latest extracted one is either done or a gap
+    last_date = _to_date(max(existing))
+    day = min_date
+    while day <= last_date:
+        if day.strftime(DATE_FORMAT) in existing:
+            checkpoint = mark_done(checkpoint, day)
+        elif checkpoint["watermark"] is None:
+            checkpoint["gaps"].append(day.strftime(DATE_FORMAT))
+        day += timedelta(days=1)
+
+    return checkpoint
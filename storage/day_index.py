@@ -0,0 +1,116 @@
+import io
+import csv
+import json
+import pandas as pd
+from datetime import datetime
+from botocore.exceptions import ClientError
+from config import S3, DAY_INDEX_SUFFIX
+from metrics import add_s3_bytes
+from storage.formats import read_typed_csv
+
+# Reads the raw object in chunks and yields (byte offset, record bytes) for every CSV record.
+# A newline only ends a record when the quotes seen so far are balanced, so quoted fields
+# spanning lines stay in one record
+def iter_records(body, chunk_size=1 << 20):
+    pending = b""
+    pending_start = 0
+    quotes = 0
+
+    for chunk in body.iter_chunks(chunk_size):
+        start = 0
+        while True:
+            newline = chunk.find(b"\n", start)
+            piece = chunk[start:] if newline == -1 else chunk[start:newline + 1]
+            quotes += piece.count(b'"')
+            pending += piece
+            if newline == -1:
+                break
+            if quotes % 2 == 0:
+                yield pending_start, pending
+                pending_start += len(pending)
+                pending = b""
+                quotes = 0
+            start = newline + 1
+
+    if pending:
+        yield pending_start, pending
+
+def _parse_record(record):
+    return next(csv.reader([record.decode("utf-8")]))
+
+# One pass over a raw file sorted by date_column, recording the [start, end) byte range of
+# every day. Rows without a date (NaT written as "") are skipped, as the day filter skips them
+def build_day_index(bucket, key, date_column):
+    head = S3.head_object(Bucket=bucket, Key=key)
+    body = S3.get_object(Bucket=bucket, Key=key)["Body"]
+    records = iter_records(body)
+
+    _, header = next(records)
+    column = _parse_record(header).index(date_column)
+
+    days = {}
+    last_day = None
+    for offset, record in records:
+        day = _parse_record(record)[column][:10]
+        if not day:
+            continue
+        if day != last_day:
+            datetime.strptime(day, "%Y-%m-%d")  # raw files store ISO timestamps
+            if day in days:
+                raise ValueError(f"{bucket}/{key} is not sorted by '{date_column}' ({day} appears twice)")
+            days[day] = [offset, offset + len(record)]
+            last_day = day
+        else:
+            days[day][1] = offset + len(record)
+
+    return {
+        "key": key,
+        "etag": head["ETag"],
+        "date_column": date_column,
+        "header": header.decode("utf-8"),
+        "days": days,
+    }
+
+def index_key(key):
+    return f"{key}{DAY_INDEX_SUFFIX}"
+
+# Loads the day index stored next to the raw object, (re)building it once when it is
+# missing or was built for an older version (ETag) of the raw file
+def load_day_index(bucket, key, date_column):
+    etag = S3.head_object(Bucket=bucket, Key=key)["ETag"]
+    try:
+        obj = S3.get_object(Bucket=bucket, Key=index_key(key))
+        index = json.loads(obj["Body"].read())
+        if index.get("etag") == etag and index.get("date_column") == date_column:
+            return index
+        print(f"Day index for {key} is stale, rebuilding...")
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+            raise
+        print(f"No day index for {key}, building it...")
+
+    index = build_day_index(bucket, key, date_column)
+    S3.put_object(Bucket=bucket, Key=index_key(key), Body=json.dumps(index).encode("utf-8"))
+    print(f"Indexed {len(index['days'])} days of {key}")
+    return index
+
+# Fetches only the given day's bytes with a ranged GET and parses them under the stored header
+# into the feed's typed schema. Days without rows come back as an empty frame with the file's columns
+def read_day(bucket, index, day, schema):
+    header = index["header"].encode("utf-8")
+    byte_range = index["days"].get(day.strftime("%Y-%m-%d"))
+
+    body = b""
+    if byte_range:
+        start, end = byte_range
+        obj = S3.get_object(Bucket=bucket, Key=index["key"], Range=f"bytes={start}-{end - 1}")
+        body = obj["Body"].read()
+        add_s3_bytes(len(body))
+
+    return read_typed_csv(io.BytesIO(header + body), schema)
+
+def first_day(index):
+    return pd.Timestamp(min(index["days"])) if index["days"] else None
+
+def last_day(index):
+    return pd.Timestamp(max(index["days"])) if index["days"] else None
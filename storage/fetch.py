@@ -0,0 +1,62 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import S3, FETCH_CONCURRENCY, FETCH_MAX_BYTES_IN_FLIGHT
+from storage.formats import day_file_kind, parse_day_file
+from metrics import add_s3_bytes
+
+# Caps the raw object bytes held by all fetch threads together. An object larger than the
+# cap reserves the whole budget, so it is read alone instead of blocking forever
+class ByteBudget:
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size):
+        size = min(size, self.limit)
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight + size <= self.limit)
+            self.in_flight += size
+        return size
+
+    def release(self, size):
+        with self._cond:
+            self.in_flight -= size
+            self._cond.notify_all()
+
+# GET, then read and parse under the byte budget; the raw bytes are dropped once parsed
+def _fetch_one(bucket, key, budget):
+    start = time.perf_counter()
+    obj = S3.get_object(Bucket=bucket, Key=key)
+    size = obj["ContentLength"]
+    add_s3_bytes(size)
+    reserved = budget.acquire(size)
+    try:
+        body = obj["Body"].read()
+        fetched = time.perf_counter()
+        df = parse_day_file(body, day_file_kind(key))
+        del body
+    finally:
+        budget.release(reserved)
+    parsed = time.perf_counter()
+
+    print(f"  • {key}: {size / 1024:.0f} KB, get {(fetched - start) * 1000:.0f} ms, "
+          f"parse {(parsed - fetched) * 1000:.0f} ms, {len(df)} rows")
+    return df
+
+# Downloads and parses day files on a thread pool, so S3 round trips overlap with parsing.
+# Frames come back in key order (YYYY/MM/DD/...), i.e. date order, whatever finished first
+def fetch_day_files(bucket, keys, concurrency=FETCH_CONCURRENCY, max_bytes_in_flight=FETCH_MAX_BYTES_IN_FLIGHT):
+    keys = sorted(keys)
+    if not keys:
+        return []
+
+    budget = ByteBudget(max_bytes_in_flight)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(keys))) as pool:
+        frames = list(pool.map(lambda key: _fetch_one(bucket, key, budget), keys))
+
+    print(f"Fetched {len(keys)} files in {time.perf_counter() - start:.2f} s "
+          f"({min(concurrency, len(keys))} threads)")
+    return frames
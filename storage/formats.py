@@ -0,0 +1,92 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from config import S3, OBJECT_FORMAT, PARQUET_COMPRESSION, DAY_FILE_EXTENSIONS, DAY_FILE_SCHEMAS
+
+# Every Parquet file starts with these bytes, CSV files never do
+PARQUET_MAGIC = b"PAR1"
+
+# Returns "online" / "offline" for a day file key such as 2023/01/05/online.parquet, else None
+def day_file_kind(key):
+    stem, extension = os.path.splitext(key.rsplit("/", 1)[-1])
+    if stem in DAY_FILE_SCHEMAS and extension in DAY_FILE_EXTENSIONS.values():
+        return stem
+    return None
+
+def day_file_key(prefix, kind, object_format=OBJECT_FORMAT):
+    return f"{prefix}{kind}{DAY_FILE_EXTENSIONS[object_format]}"
+
+def _is_datetime(dtype):
+    return str(dtype).startswith("datetime64")
+
+# Casts the columns a schema knows about to their declared dtypes
+def apply_schema(df, schema):
+    return df.astype({col: dtype for col, dtype in schema.items() if col in df.columns})
+
+# Reads a CSV straight into the schema's dtypes, so text never lands in object columns first.
+# Timestamps are parsed afterwards; like before, an unparseable one becomes NaT
+def read_typed_csv(source, schema) -> pd.DataFrame:
+    df = pd.read_csv(source, dtype={col: dtype for col, dtype in schema.items() if not _is_datetime(dtype)})
+    for col, dtype in schema.items():
+        if _is_datetime(dtype) and col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    return df
+
+# Nullable extension dtypes, floats and timestamps; a plain int64 column cannot take the NA
+def _holds_na(dtype):
+    return isinstance(dtype, pd.api.extensions.ExtensionDtype) or dtype.kind in "fmM"
+
+# pd.concat keeps a categorical column only when every frame has the very same categories, so
+# days with different values would fall back to object; the categories are unioned first.
+# A column that is all NA in a frame (None-filled for the feed that lacks it) takes the dtype
+# of the frames with values, instead of turning the result into object
+def concat_frames(frames, ignore_index=True) -> pd.DataFrame:
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame()
+    categories, dtypes = {}, {}
+    for df in frames:
+        for col, dtype in df.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                categories.setdefault(col, []).append(dtype.categories.astype(object))
+            elif col not in dtypes and _holds_na(dtype) and not df[col].isna().all():
+                dtypes[col] = dtype
+    dtypes.update({col: pd.CategoricalDtype(pd.Index(pd.unique(np.concatenate(cats))))
+                   for col, cats in categories.items()})
+
+    def conform(df):
+        casts = {col: dtype for col, dtype in dtypes.items() if col in df.columns and df[col].dtype != dtype
+                 and (isinstance(dtype, pd.CategoricalDtype) or df[col].isna().all())}
+        return df.astype(casts) if casts else df
+
+    frames = [conform(df) for df in frames]
+    return pd.concat(frames, ignore_index=ignore_index)
+
+# Serializes one day of online/offline data in the configured format and uploads it
+def write_day_file(df, bucket, prefix, kind, object_format=OBJECT_FORMAT):
+    key = day_file_key(prefix, kind, object_format)
+
+    if object_format == "parquet":
+        buffer = io.BytesIO()
+        apply_schema(df, DAY_FILE_SCHEMAS[kind]).to_parquet(
+            buffer, engine="pyarrow", compression=PARQUET_COMPRESSION, index=False
+        )
+    else:
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False)
+
+    S3.put_object(Bucket=bucket, Key=key, Body=buffer.getvalue())
+    print(f"Saved {key}")
+    return key
+
+# Parses a day file body, detecting Parquet by its magic bytes so old CSV days still load.
+# Both formats come back with the same typed schema, so CSV and Parquet days concat cleanly
+def parse_day_file(body: bytes, kind) -> pd.DataFrame:
+    if body[:len(PARQUET_MAGIC)] == PARQUET_MAGIC:
+        return apply_schema(pd.read_parquet(io.BytesIO(body), engine="pyarrow"), DAY_FILE_SCHEMAS[kind])
+    return read_typed_csv(io.BytesIO(body), DAY_FILE_SCHEMAS[kind])
+
+def read_day_file(bucket, key) -> pd.DataFrame:
+    obj = S3.get_object(Bucket=bucket, Key=key)
+    return parse_day_file(obj["Body"].read(), day_file_kind(key))
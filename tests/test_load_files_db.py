@@ -0,0 +1,176 @@
+"""
+Runs load_files against a fully migrated database (partitioned sales, aggregates, row hashes,
+playground replication). Needs a throwaway PostgreSQL database:
+
+    TEST_DB_NAME=etl_test DB_HOST=localhost DB_PORT=5432 DB_USER=postgres python -m pytest -q tests
+
+The prod, playground and etl_meta schemas of that database are dropped and recreated.
+Without TEST_DB_NAME these tests are skipped.
+"""
+import io
+import os
+import pytest
+
+TEST_DB_NAME = os.getenv("TEST_DB_NAME")
+pytestmark = pytest.mark.skipif(not TEST_DB_NAME, reason="TEST_DB_NAME is not set")
+
+
+@pytest.fixture(scope="module")
+def conn():
+    os.environ["DB_NAME"] = TEST_DB_NAME  # read when the pool connects
+    from config import SEEDS, SEEDS_MAPPING
+    from db.migrate import migrate
+    from db.pool import pooled_connection
+    from scripts.load_dim_tables import copy_seed
+
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP SCHEMA IF EXISTS prod, playground, etl_meta CASCADE")
+        conn.commit()
+        migrate(conn)
+        with conn.cursor() as cur:
+            for schema in ["prod", "playground"]:
+                for file_name, table_name in SEEDS_MAPPING.items():
+                    copy_seed(cur, os.path.join(SEEDS, file_name), table_name, schema)
+        conn.commit()
+        yield conn
+
+
+# Synthetic raw frames, round-tripped through CSV into the typed schemas like a day file
+@pytest.fixture(scope="module")
+def batch():
+    from config import ONLINE_SCHEMA, OFFLINE_SCHEMA
+    from benchmarks.synthetic import generate_sales
+    from storage.formats import read_typed_csv
+
+    online, offline = generate_sales(3000, days=40, start="2023-01-20", seed=7)
+    frames = []
+    for df, schema in ((online, ONLINE_SCHEMA), (offline, OFFLINE_SCHEMA)):
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False)
+        buffer.seek(0)
+        frames.append(read_typed_csv(buffer, schema))
+    return frames
+
+
+@pytest.fixture(scope="module")
+def customer_cache(tmp_path_factory):
+    from etl.customer_cache import CustomerDeltaCache
+    return CustomerDeltaCache(str(tmp_path_factory.mktemp("cache") / "customers.sqlite"))
+
+
+def load(conn, batch, customer_cache, monkeypatch):
+    import scripts.etl_upsert_customers_sales as etl
+    monkeypatch.setattr(etl, "CUSTOMER_CACHE", customer_cache)
+    customer_cache.sync(conn, replicas=["playground"])
+    customer_ids = etl.load_files(*batch, conn)
+    conn.commit()
+    customer_cache.commit(customer_ids)
+
+
+def scalar(conn, sql):
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchone()[0]
+
+
+# Playground numbers its customers itself: one customer of its own shifts its ids off prod's
+def test_load_files_fills_partitioned_sales_in_both_schemas(conn, batch, customer_cache, monkeypatch):
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO playground.customers (customer_email) VALUES ('playground.only@example.com')")
+    conn.commit()
+    load(conn, batch, customer_cache, monkeypatch)
+
+    loaded = scalar(conn, "SELECT COUNT(*) FROM prod.sales")
+    assert loaded > 0
+    assert scalar(conn, "SELECT COUNT(*) FROM playground.sales") == loaded
+    # every playground sale belongs to the customer with the email of its prod sale
+    assert scalar(conn, """
+        SELECT COUNT(*)
+        FROM prod.sales AS p
+        JOIN prod.customers AS pc ON pc.customer_id = p.customer_id
+        JOIN playground.customers AS rc ON rc.customer_email = pc.customer_email
+        JOIN playground.sales AS r ON r.customer_id = rc.customer_id AND r.tmstmp = p.tmstmp
+    """) == loaded
+    # the rows went into the monthly partitions, not the default one
+    assert scalar(conn, "SELECT COUNT(*) FROM prod.sales_2023_02") > 0
+    assert scalar(conn, "SELECT COUNT(*) FROM prod.sales_default") == 0
+    assert scalar(conn, "SELECT SUM(transactions) FROM prod.agg_daily_sales") == loaded
+
+
+def test_replayed_sales_are_counted_unchanged(conn, batch, customer_cache, monkeypatch):
+    from etl.etl_sales import transform_sales, upsert_sales
+
+    load(conn, batch, customer_cache, monkeypatch)
+    sales = transform_sales(*batch, conn, "prod")
+    result = upsert_sales(sales, conn, "prod", commit=False)
+    conn.rollback()
+
+    assert (result.inserted, result.updated) == (0, 0)
+    assert result.unchanged == result.sent
+
+
+def test_changed_sales_are_counted_updated(conn, batch):
+    from etl.etl_sales import transform_sales, upsert_sales
+
+    sales = transform_sales(*batch, conn, "prod")
+    sales.loc[sales.index[:10], "quantity_sold"] += 1
+    result = upsert_sales(sales, conn, "prod", commit=False)
+    conn.rollback()
+
+    assert (result.inserted, result.updated) == (0, 10)
+
+
+# sync finds playground customers that were deleted or edited behind the ETL's back, even while
+# playground holds as many customers as prod, and leaves its own customer alone
+def test_sync_refills_missing_and_changed_replica_customers(conn, customer_cache):
+    with conn.cursor() as cur:
+        newest = "(SELECT customer_id FROM playground.customers ORDER BY customer_id DESC LIMIT 1)"
+        cur.execute(f"DELETE FROM playground.sales WHERE customer_id = {newest}")
+        cur.execute(f"DELETE FROM playground.customers WHERE customer_id = {newest}")
+        cur.execute("INSERT INTO playground.customers (customer_email) VALUES ('another.only@example.com')")
+        cur.execute("""
+            UPDATE playground.customers SET customer_city = 'Nowhere'
+            WHERE customer_email = (SELECT customer_email FROM prod.customers ORDER BY customer_id LIMIT 1)
+        """)
+    conn.commit()
+    assert scalar(conn, "SELECT COUNT(*) FROM playground.customers") == \
+        scalar(conn, "SELECT COUNT(*) FROM prod.customers") + 1
+
+    customer_cache.sync(conn, replicas=["playground"])
+
+    assert scalar(conn, """
+        SELECT COUNT(*) FROM prod.customers AS p
+        LEFT JOIN playground.customers AS r ON r.customer_email = p.customer_email
+        WHERE r.customer_email IS NULL OR r.customer_city IS DISTINCT FROM p.customer_city
+    """) == 0
+    assert scalar(conn, """
+        SELECT COUNT(*) FROM playground.customers
+        WHERE customer_email IN ('playground.only@example.com', 'another.only@example.com')
+    """) == 2
+
+
+# 0002 on a scratch schema holding an undated sale: the copy into the partitioned table
+# skips it and keeps it in sales_null_tmstmp
+def test_partition_migration_sets_undated_sales_aside(conn):
+    from db.migrate import load_migrations
+
+    migrations = {version: sql for version, _, sql in load_migrations()}
+    with conn.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS migration_test CASCADE")
+        cur.execute("CREATE SCHEMA migration_test")
+        cur.execute(migrations[1].replace("{{schema}}", "migration_test"))
+        cur.execute("""
+            INSERT INTO migration_test.sales (tmstmp, quantity_sold)
+            VALUES ('2023-02-01 10:00', 1), (NULL, 2)
+        """)
+        cur.execute(migrations[2].replace("{{schema}}", "migration_test"))
+
+        cur.execute("SELECT quantity_sold FROM migration_test.sales")
+        moved = cur.fetchall()
+        cur.execute("SELECT quantity_sold FROM migration_test.sales_null_tmstmp")
+        set_aside = cur.fetchall()
+    conn.rollback()
+
+    assert moved == [(1,)]
+    assert set_aside == [(2,)]
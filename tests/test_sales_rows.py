@@ -0,0 +1,47 @@
+import io
+import pandas as pd
+from config import ONLINE_SCHEMA, OFFLINE_SCHEMA, TMSTMP, DATE
+from benchmarks.synthetic import generate_sales
+from etl.etl_sales import sales_rows
+from storage.formats import read_typed_csv
+from tests.dimensions import seed_lookups
+
+
+def typed_batch(rows, **kwargs):
+    frames = []
+    for df, schema in zip(generate_sales(rows, **kwargs), (ONLINE_SCHEMA, OFFLINE_SCHEMA)):
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False)
+        buffer.seek(0)
+        frames.append(read_typed_csv(buffer, schema))
+    return frames
+
+
+def test_sales_rows_resolve_every_seeded_dimension():
+    online, offline = typed_batch(400, days=3, seed=11)
+    sales = sales_rows(online, offline, seed_lookups())
+
+    assert len(sales) == len(online) + len(offline)
+    for col in ["product_id", "store_id", "payment_method_id"]:
+        assert sales[col].notna().all()
+
+
+# sales are keyed on (customer_id, tmstmp) and partitioned on tmstmp, so undated rows are dropped
+def test_sales_rows_drop_rows_without_a_timestamp():
+    online, offline = typed_batch(400, days=3, seed=11)
+    online.loc[online.index[:3], TMSTMP] = pd.NaT
+    offline.loc[offline.index[:2], DATE] = pd.NaT
+
+    sales = sales_rows(online, offline, seed_lookups())
+
+    assert len(sales) == len(online) + len(offline) - 5
+    assert sales[TMSTMP].notna().all()
+    assert sales[TMSTMP].is_monotonic_increasing
+
+
+# transform_sales sums this over the day parts for the dimension cache report
+def test_sales_rows_report_their_resolve_time():
+    online, offline = typed_batch(100, days=2, seed=5)
+    sales = sales_rows(online, offline, seed_lookups())
+
+    assert sales.attrs["resolve_ms"] >= 0
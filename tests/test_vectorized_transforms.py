@@ -0,0 +1,86 @@
+"""
+Property-based checks that the column-wise transforms give the same values as the
+row-wise code they replaced:
+
+    pip install -r tests/requirements.txt
+    python -m pytest -q tests
+"""
+import math
+import pandas as pd
+from hypothesis import given, settings, strategies as st
+from config import ONLINE_SALES_CHANNEL, OFFLINE_SALES_CHANNEL
+from etl.etl_customers import normalize_phone, normalize_phones
+from etl.etl_sales import apply_offline_defaults
+
+PHONE_CHARACTERS = "0123456789()-. +x/"
+
+phone_text = st.text(alphabet=PHONE_CHARACTERS, max_size=16)
+object_phones = st.one_of(
+    phone_text,
+    st.integers(min_value=0, max_value=10 ** 12),
+    st.floats(min_value=0, max_value=1e12),
+    st.just(float("nan")),
+    st.none(),
+)
+
+
+def assert_same_values(actual, expected):
+    assert len(actual) == len(expected)
+    for got, want in zip(actual.tolist(), expected.tolist()):
+        if not isinstance(want, str) and pd.isna(want):
+            assert not isinstance(got, str) and pd.isna(got)
+        elif isinstance(want, float):
+            assert got == want or (math.isnan(got) and math.isnan(want))
+        else:
+            assert got == want
+
+
+@settings(max_examples=300)
+@given(st.lists(object_phones, max_size=50))
+def test_normalize_phones_matches_row_wise_on_object_values(values):
+    phones = pd.Series(values, dtype=object)
+    assert_same_values(normalize_phones(phones), phones.map(normalize_phone))
+
+
+@settings(max_examples=300)
+@given(st.lists(st.one_of(phone_text, st.none()), max_size=50))
+def test_normalize_phones_matches_row_wise_on_string_dtype(values):
+    phones = pd.Series(values, dtype="string")
+    assert_same_values(normalize_phones(phones), phones.map(normalize_phone))
+
+
+# The apply(axis=1) passes transform_sales used before the columns were masked
+def row_wise_offline_defaults(df):
+    coupon = df.apply(
+        lambda row: 0 if row['sales_channel'] == OFFLINE_SALES_CHANNEL else float(row['coupon_discount']),
+        axis=1)
+    shipping = df.apply(
+        lambda row: 5 if row['sales_channel'] == OFFLINE_SALES_CHANNEL else row['shipping_method_id'],
+        axis=1)
+    return coupon, shipping
+
+
+sales_rows = st.lists(
+    st.tuples(
+        st.sampled_from([ONLINE_SALES_CHANNEL, OFFLINE_SALES_CHANNEL]),
+        st.one_of(st.sampled_from([0.0, 5.0, 10.0, 25.0]), st.just(float("nan"))),
+        st.one_of(st.integers(min_value=1, max_value=5), st.none()),
+    ),
+    min_size=1, max_size=50,
+)
+
+
+@settings(max_examples=300)
+@given(sales_rows, st.booleans())
+def test_offline_defaults_match_row_wise(rows, categorical_channel):
+    channels, coupons, shipping_ids = zip(*rows)
+    df = pd.DataFrame({
+        "sales_channel": pd.Series(channels, dtype="category" if categorical_channel else object),
+        "coupon_discount": pd.Series(coupons, dtype=float),
+        "shipping_method_id": pd.Series(shipping_ids, dtype="Int64"),
+    })
+    expected_coupon, expected_shipping = row_wise_offline_defaults(df)
+
+    result = apply_offline_defaults(df.copy())
+    assert_same_values(result["coupon_discount"], expected_coupon.astype(float))
+    assert_same_values(result["shipping_method_id"].astype(object), expected_shipping.astype(object))